@@ -1,5 +1,8 @@
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QLabel
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QLabel, \
+        QPushButton
 from util import makeButton, SetEncoder, keyStringToKeyCode
+from Win32Backend import Win32Backend
+from Calibration import calibrate
 import DoubleClickWidgets
 import json
 import os
@@ -13,6 +16,9 @@ class AppConfig(QWidget):
         recorder (Hotkeys): Hotkey recorder used throughout the program.
         ui (Ui_MainWindow): Main window of this program.
         config (dict): Dictionary that holds user configurable options.
+        panicKeys (frozenset): KeyCodes of the panic shortcut, converted
+                               once whenever the config is read or saved so
+                               the keyboard hook can just compare sets.
     """
 
     
@@ -20,10 +26,48 @@ class AppConfig(QWidget):
     recorder = None
     mainUI = None
     shortcutFunctions = None
+    panicKeys = frozenset()
     config = {
         'shortcuts': {
             'recordShortcut': [None, ''],
         },
+        'recording': {
+            # Times per second hold times are refreshed and newly recorded
+            # steps are displayed.
+            'refreshRate': 30,
+            # Don't display anything until recording stops.
+            'fastRecord': False,
+            # Seconds without any input before an active wait step starts.
+            'waitThreshold': .1,
+            # Seconds without scrolling before a scroll step is finished.
+            'scrollThreshold': 1,
+        },
+        'playback': {
+            # Seconds before each deadline to stop sleeping and start spinning
+            'spinThreshold': .002,
+            # Seconds a key is held before it auto-repeats. 0 disables it.
+            'repeatDelay': 0,
+            # Auto-repeats per second
+            'repeatRate': 30,
+            # Mouse positions per second sent while dragging. 0 jumps
+            # straight from where the drag starts to where it ends.
+            'dragRate': 60,
+            # Keys that stop every macro and release everything they hold.
+            # Checked by the input hook, so it works while macros are running.
+            'panicShortcut': ['Key.ctrl', 'Key.alt', 'Key.esc'],
+            # Play macros back in a child process so a busy GUI can't delay
+            # them.
+            'separateProcess': False,
+            # Seconds each output path takes to get an input accepted by
+            # the OS. Filled in by calibrating, and subtracted from each
+            # event's deadline.
+            'latency': {
+                'key': 0,
+                'extendedKey': 0,
+                'mouse': 0,
+                'scroll': 0,
+            },
+        },
     }
 
     def __init__(self, parent=None):
@@ -48,6 +92,11 @@ class AppConfig(QWidget):
         recordShortcut.addWidget(shortcut)
         recordShortcut.addWidget(shortcut.getEditor())
 
+        calibrateButton = QPushButton('Calibrate Latency', self)
+        calibrateButton.setToolTip('Measure how long input takes to send on '
+                'this machine')
+        calibrateButton.clicked.connect(AppConfig._calibrate)
+
         buttonLayout = QHBoxLayout()
         saveButton = makeButton(self, "image: url(:/images/images/save.png);\n"
                 "padding: 4px;")
@@ -56,6 +105,7 @@ class AppConfig(QWidget):
         saveButton.clicked.connect(AppConfig._writeConfig)
 
         configLayout.addLayout(recordShortcut)
+        configLayout.addWidget(calibrateButton)
         configLayout.addLayout(buttonLayout)
         self.setLayout(configLayout)
 
@@ -67,16 +117,31 @@ class AppConfig(QWidget):
             'recordShortcut': mainUI.recordShortcut.emit
         }
 
+    @classmethod
+    def _calibrate(cls):
+        """Measures playback latency. Saved along with the rest."""
+        cls.config['playback']['latency'] = calibrate(Win32Backend())
+
     @classmethod
     def _writeConfig(cls):
+        cls._updatePanicKeys()
         with open(cls._CONFIG_FILE, 'w') as configFile:
             json.dump(cls.config, configFile, cls=SetEncoder)
 
+    @classmethod
+    def _updatePanicKeys(cls):
+        cls.panicKeys = frozenset(keyStringToKeyCode(key)
+                for key in cls.config['playback']['panicShortcut'])
+
     @classmethod
     def readConfig(cls):
         if os.path.exists(cls._CONFIG_FILE):
             with open(cls._CONFIG_FILE, 'r') as configFile:
-                cls.config = {**cls.config, **json.load(configFile)}
+                # Merge each section so options added since the file was
+                # written keep their defaults.
+                for section, options in json.load(configFile).items():
+                    cls.config[section] = {**cls.config.get(section, {}),
+                            **options}
 
             shortcuts = cls.config['shortcuts']
             # Python pattern matching is so nice
@@ -87,6 +152,7 @@ class AppConfig(QWidget):
                     cls.recorder.addHotkey(keys,
                             customFunc=cls.shortcutFunctions[option],
                             recording=False)
+        cls._updatePanicKeys()
 
     def closeEvent(self, event):
         #TODO
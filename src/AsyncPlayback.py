@@ -0,0 +1,206 @@
+"""File containing the asyncio interface to play back macros.
+
+Meant for embedding Macro Now's playback in programs that already run an
+asyncio event loop. Instead of a thread per macro, each macro schedules a
+single callback on the event loop for its next deadline, so thousands of
+macros can play back on one loop.
+
+Example:
+
+    handle = await play(steps, totalTime, Win32Backend(), loops=3)
+    handle.addProgressCallback(lambda handle: print(handle.progress()))
+    lateness = await handle
+
+Each macro is played back by a MacroRunner, with the handle standing in for
+the PlaybackScheduler, so options, held inputs and telemetry work exactly
+as they do in the GUI.
+
+Deadlines are measured with the event loop's clock, so playback is only as
+accurate as the loop's timers (usually around a millisecond, but as coarse
+as the system timer on Windows). A PlaybackScheduler is more accurate when
+that matters.
+"""
+
+from MacroRunner import MacroRunner
+from threading import Condition
+import asyncio
+
+class PlaybackHandle():
+    """Awaitable handle to a macro playing back on an event loop.
+
+    Awaiting the handle waits for the macro to finish and returns the latest
+    any event fired in each loop, in seconds. Awaiting a cancelled handle
+    raises CancelledError. Cancelling the handle, or the future of a task
+    awaiting it (e.g. with asyncio.wait_for), stops the macro and releases
+    whatever it's holding.
+
+    To the runner, the handle is its scheduler: it only needs now(), add(),
+    reschedule() and a condition to guard its requests with, and the handle
+    answers them by keeping one loop.call_at timer for the runner's next
+    deadline.
+
+    Attributes:
+        loop (AbstractEventLoop): Event loop the macro plays back on.
+        runner (MacroRunner): Runner playing back the macro. None until
+                              start() is called.
+        future (Future): Resolved once the macro is done.
+        condition (Condition): Held by the runner while it queues requests.
+    """
+
+    def __init__(self, loop):
+        """Initializes instance variables. See the class docstring."""
+        self.loop = loop
+        self.runner = None
+        self.future = loop.create_future()
+        self.future.add_done_callback(self._onDone)
+        self.condition = Condition()
+        self._callbacks = []
+        self._timer = None
+
+    def __await__(self):
+        return self.future.__await__()
+
+    def done(self):
+        return self.future.done()
+
+    def progress(self):
+        """Returns how far along the macro is. See MacroRunner.progress."""
+        return self.runner.progress()
+
+    def addProgressCallback(self, func):
+        """Calls the passed in function with this handle after every slot.
+
+        Args:
+            func (func): Function to call. Called on the event loop, so it
+                         shouldn't block.
+        """
+        self._callbacks.append(func)
+
+    def start(self, runner):
+        """Starts playing back the passed in runner.
+
+        Args:
+            runner (MacroRunner): Runner created with this handle as its
+                                  scheduler.
+        """
+        self.runner = runner
+        runner.start()
+
+    def cancel(self):
+        """Stops playing back the macro and releases whatever it's holding.
+
+        Return: False if the macro was already done, True otherwise.
+        """
+        if not self.future.cancel():
+            return False
+        self._stop()
+        return True
+
+    def now(self):
+        return self.loop.time()
+
+    def add(self, stream):
+        self._schedule()
+
+    def reschedule(self, stream):
+        self._schedule()
+
+    def _schedule(self):
+        """Sets the timer for the runner's next deadline."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self.future.done():
+            return
+        deadline = self.runner.nextDeadline()
+        if deadline is not None:
+            self._timer = self.loop.call_at(deadline, self._perform, deadline)
+
+    def _onDone(self, future):
+        if future.cancelled():
+            self._stop()
+
+    def _stop(self):
+        """Stops the runner right away and finishes it."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        runner = self.runner
+        if runner is None or not runner.is_alive():
+            return
+        runner.stop()
+        try:
+            self._runSlot(self.loop.time())
+        finally:
+            runner.finish()
+
+    def _runSlot(self, now):
+        """Performs everything due and flushes it, like a scheduler slot.
+
+        Return: Whether the runner has anything left to perform.
+        """
+        runner = self.runner
+        alive = runner.perform(now)
+        emitted = self.loop.time()
+        runner.backend.flush()
+        runner.recordSlot(emitted, self.loop.time() - emitted)
+        return alive
+
+    def _perform(self, deadline):
+        """Performs every event due by the deadline the loop woke us for."""
+        self._timer = None
+        if self.future.done():
+            return
+        runner = self.runner
+
+        # The event loop may wake us a little early, so everything due by
+        # the deadline counts as due. A progress callback raising stops the
+        # macro the same way an error playing it back does.
+        try:
+            alive = self._runSlot(max(self.loop.time(), deadline))
+            for func in self._callbacks:
+                func(self)
+        except Exception as e:
+            try:
+                if runner.is_alive():
+                    runner.finish()
+            finally:
+                if not self.future.done():
+                    self.future.set_exception(e)
+            return
+
+        if self.future.done():
+            return
+        if alive:
+            self._schedule()
+        else:
+            runner.finish()
+            self.future.set_result(runner.getLoopLateness())
+
+async def play(steps, totalTime, backend, loops=1, options=None,
+        repeatDelay=0, repeatRate=0, dragRate=0, latency=None):
+    """Starts playing back a macro on the running event loop.
+
+    The macro is compiled before returning, so its deadlines are all known
+    ahead of time.
+
+    Args:
+        steps (list): List of tuples containing the data of each step. More
+                      details in KeyListWidgetStep.
+        totalTime (float): Time it takes to run the macro.
+        backend (InputBackend): Where to send events.
+        loops (int): Number of times to play the macro. -1 to play it until
+                     the returned handle is cancelled.
+        options (dict): Playback options of the macro. See MacroRunner.
+        repeatDelay (float): See MacroCompiler.compileMacro.
+        repeatRate (float): See MacroCompiler.compileMacro.
+        dragRate (float): See MacroCompiler.compileMacro.
+        latency (dict): See MacroCompiler.compileMacro.
+
+    Return: PlaybackHandle of the macro.
+    """
+    handle = PlaybackHandle(asyncio.get_running_loop())
+    handle.start(MacroRunner(steps, totalTime, loops, None, None, backend,
+            repeatDelay=repeatDelay, repeatRate=repeatRate, options=options,
+            scheduler=handle, dragRate=dragRate, latency=latency))
+    return handle
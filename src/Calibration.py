@@ -0,0 +1,70 @@
+"""File containing the routine that measures playback latency.
+
+Every output path (scan code keys, extended keys, mouse input and scrolls)
+takes a different amount of time between the scheduler deciding to send an
+input and the OS accepting it. calibrate measures how long each path takes
+on the current machine, so MacroCompiler.compileMacro can send each event
+that much earlier.
+
+Calibrating sends real input, but only input that doesn't do anything on
+its own: a shift tap, a right ctrl tap, a mouse move of zero pixels and a
+scroll of zero ticks.
+"""
+
+from KeyboardController import MOUSEEVENTF_MOVE
+from Clock import defaultClock
+import statistics
+
+def _measure(emit, flush, clock, samples):
+    """Returns the median time it takes to emit and flush an input.
+
+    Args:
+        emit (func): Queues the input to send.
+        flush (func): Sends every queued input.
+        clock (RealClock): Clock to time with.
+        samples (int): Number of times to send the input.
+    """
+    durations = []
+    for _ in range(samples):
+        start = clock.now()
+        emit()
+        flush()
+        durations.append(clock.now() - start)
+    return statistics.median(durations)
+
+def calibrate(backend, samples=50, clock=defaultClock):
+    """Measures how long each output path takes to send an input.
+
+    Keys are tapped, sending the press and release separately, and half
+    the time the tap takes is kept.
+
+    Args:
+        backend (InputBackend): Backend to measure.
+        samples (int): Number of inputs to send through each path. The
+                       median is kept so a stray context switch doesn't
+                       skew it.
+        clock (RealClock): Clock to time with.
+
+    Return: Dict mapping each output path to the seconds it takes. See
+            MacroCompiler.latencyPath.
+    """
+    table = backend.keyTable()
+    latency = {}
+    for path, key in (('key', 'shift'), ('extendedKey', 'ctrl_r')):
+        record = table.lookup(key)
+
+        def press():
+            backend.keyDown(record)
+            backend.flush()
+            backend.keyUp(record)
+
+        latency[path] = _measure(press, backend.flush, clock, samples) / 2
+
+    # Moving the mouse by 0 relative to where it is goes through the same
+    # SendInput call as clicks without clicking anything.
+    latency['mouse'] = _measure(
+            lambda: backend.mouseButton(0, 0, MOUSEEVENTF_MOVE),
+            backend.flush, clock, samples)
+    latency['scroll'] = _measure(lambda: backend.scroll(0), backend.flush,
+            clock, samples)
+    return latency
@@ -0,0 +1,126 @@
+"""File containing the clocks used to measure and wait for time.
+
+Everything that needs the current time or needs to sleep goes through a
+clock rather than calling time.time() and time.sleep() directly. This way
+playback can be simulated with a VirtualClock, which skips straight to
+whenever it's next needed instead of actually waiting.
+"""
+
+from threading import Lock
+import ctypes
+import math
+import time
+
+# Windows only wakes sleeping threads on the system timer tick, which is
+# 15.6 ms unless something asks for it to be faster. ctypes.WinDLL only
+# exists on Windows.
+try:
+    _winmm = ctypes.WinDLL('winmm')
+except (AttributeError, OSError):
+    _winmm = None
+
+class RealClock():
+    """Clock backed by the system's monotonic high resolution counter.
+
+    Unlike time.time(), this is never affected by changes to the wall clock.
+
+    Attributes:
+        realtime (bool): Whether this clock's time passes on its own.
+    """
+
+    realtime = True
+
+    def nowNs(self):
+        """Returns the current time in nanoseconds."""
+        return time.perf_counter_ns()
+
+    def now(self):
+        """Returns the current time in seconds."""
+        return time.perf_counter_ns() / 1e9
+
+    def sleep(self, seconds):
+        """Blocks for the passed in number of seconds."""
+        time.sleep(seconds)
+
+    def raiseResolution(self):
+        """Makes sleeps and timed waits accurate to about a millisecond.
+
+        On Windows this raises the system timer's resolution for the whole
+        machine, so it costs power and should be undone with
+        restoreResolution once nothing needs it. Does nothing elsewhere.
+        """
+        if _winmm:
+            _winmm.timeBeginPeriod(1)
+
+    def restoreResolution(self):
+        """Undoes raiseResolution."""
+        if _winmm:
+            _winmm.timeEndPeriod(1)
+
+class VirtualClock():
+    """Clock whose time only passes when something sleeps on it.
+
+    Sleeping returns immediately after moving the clock forward, so a macro
+    that would take an hour to play back is simulated in however long it
+    takes to perform its events.
+
+    Attributes:
+        realtime (bool): Whether this clock's time passes on its own.
+        current (int): Current time in nanoseconds.
+        lock (Lock): Prevents threads sleeping at the same time from losing
+                     each other's updates.
+    """
+
+    realtime = False
+
+    def __init__(self, start=0):
+        """Initializes instance variables.
+
+        Args:
+            start (int): Time in nanoseconds to start the clock at.
+        """
+        self.current = start
+        self.lock = Lock()
+
+    def nowNs(self):
+        """Returns the current time in nanoseconds."""
+        return self.current
+
+    def now(self):
+        """Returns the current time in seconds."""
+        return self.current / 1e9
+
+    def sleep(self, seconds):
+        """Moves the clock forward by the passed in number of seconds."""
+        self.advance(round(seconds * 1e9))
+
+    def raiseResolution(self):
+        pass
+
+    def restoreResolution(self):
+        pass
+
+    def advance(self, nanoseconds):
+        """Moves the clock forward by the passed in number of nanoseconds."""
+        if nanoseconds > 0:
+            with self.lock:
+                self.current += nanoseconds
+
+    def advanceTo(self, seconds):
+        """Moves the clock forward to the passed in time.
+
+        Rounds up to the next nanosecond so now() is never less than the
+        passed in time afterwards.
+
+        Args:
+            seconds (float): Time in seconds to move the clock to.
+        """
+        target = math.ceil(seconds * 1e9)
+        # Multiplying can round down, so make sure converting back doesn't.
+        while target / 1e9 < seconds:
+            target += 1
+        with self.lock:
+            self.current = max(self.current, target)
+
+# Clock used when no other clock is passed in.
+defaultClock = RealClock()
@@ -146,6 +146,8 @@ class EditLabelKeySequence(EditLabel):
                       to.
         loopNum (int): Total times to run this macro. If -1 macro runs until
                        the hotkey is pressed again.
+        options (dict): Playback options of this macro. See
+                        MacroCompiler.retimeSteps.
         customFunc (func): Function to run if this class isn't used for
                            recording hotkeys for macros.
         config (str): The configuration option this changes, or the empty string
@@ -176,6 +178,7 @@ class EditLabelKeySequence(EditLabel):
         self.steps = None
         self.time = 0
         self.loopNum = 0
+        self.options = {}
         self.customFunc = customFunc
         self.config = config
 
@@ -210,7 +213,8 @@ class EditLabelKeySequence(EditLabel):
         self.editor.clear()
         self._beginEdit()
         self.recorder.recordHotkey(self.keys, self.steps, self.time,
-                self.loopNum, self._finishEditing, self.customFunc)
+                self.loopNum, self._finishEditing, self.customFunc,
+                self.options)
 
 class MacroWidget(QWidget):
     """Widget that represents an individual macro.
@@ -224,6 +228,8 @@ class MacroWidget(QWidget):
         editLabel (EditLabelLine): Name editor for this macro.
         loopSelector (QComboBox): Combo box selector to select number of times
                                   this macro loops.
+        speedSelector (QComboBox): Combo box selector to select how fast this
+                                   macro is played back.
         time (float): Time it takes to run this macro in seconds.
 
     Class Attributes:
@@ -233,7 +239,7 @@ class MacroWidget(QWidget):
     ui = None
 
     def __init__(self, listWidget, keyEdit, editLabel, loopSelector,
-            time, parent=None):
+            speedSelector, time, parent=None):
         """Initializes instance variables and sets up selector change event.
         
         Getters and setters of this class also get members of the 
@@ -246,6 +252,8 @@ class MacroWidget(QWidget):
             editLabel (EditLabelLine): Name editor for this macro.
             loopSelector (QComboBox): Combo box selector to select number of
                                       times this macro loops.
+            speedSelector (QComboBox): Combo box selector to select how fast
+                                       this macro is played back.
             time (float): Time it takes to run this macro in seconds.
             parent (QWidget): QWidget to set as this widget's parent.
         
@@ -256,6 +264,8 @@ class MacroWidget(QWidget):
         self.editLabel = editLabel
         self.loopSelector = loopSelector
         self.loopSelector.currentTextChanged.connect(self._loopNumChanged)
+        self.speedSelector = speedSelector
+        self.speedSelector.currentTextChanged.connect(self._speedChanged)
         self.time = time
 
     def mouseDoubleClickEvent(self, event):
@@ -310,7 +320,16 @@ class MacroWidget(QWidget):
         self.listWidget.setLoopNum(num)
         idx = self.getRecorder().findHotkey(self.getKeys(), recording=False)
         self.getRecorder().setHotkey(idx, self.getKeys(), self.getSteps(),
-                self.getTime(), num, recording=False)
+                self.getTime(), num, recording=False,
+                options=self.getOptions())
+
+    def _speedChanged(self, text):
+        """Updates macro to play back at the passed in speed (e.g. '2x')."""
+        self.setOptions({**self.getOptions(), 'speed': float(text[:-1])})
+        idx = self.getRecorder().findHotkey(self.getKeys(), recording=False)
+        self.getRecorder().setHotkey(idx, self.getKeys(), self.getSteps(),
+                self.getTime(), self.getLoopNum(), recording=False,
+                options=self.getOptions())
 
     def getSteps(self):
         return self.keyEdit.steps
@@ -342,6 +361,12 @@ class MacroWidget(QWidget):
     def setLoopNum(self, num):
         self.keyEdit.loopNum = num
 
+    def getOptions(self):
+        return self.keyEdit.options
+
+    def setOptions(self, options):
+        self.keyEdit.options = options
+
     def getMacroName(self):
         return self.editLabel.getSavedText()
 
@@ -0,0 +1,116 @@
+"""File containing the ledger of every input macros are holding down.
+
+Every running macro records the keys and mouse buttons it presses in the
+process-wide heldInputs ledger, and removes them once they're released.
+If a macro dies mid-hold, or the program exits while a macro is running,
+releaseAll() lets go of whatever is still held so nothing stays pressed in
+Windows.
+"""
+
+from StepTypes import EventEnum
+from threading import Lock
+from contextlib import nullcontext
+import atexit
+
+class HeldInputLedger():
+    """Keeps track of every input held down by any macro.
+
+    Inputs are counted, so an input held by two macros is only forgotten
+    once both release it.
+
+    Attributes:
+        lock (Lock): Prevents macros on different threads from losing each
+                     other's updates.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+
+        # Mapping of id(backend) -> (backend, {inputId: [release, count]})
+        self._held = {}
+
+        # Mapping of id(backend) -> lock held while sending through it.
+        self._guards = {}
+
+    def guard(self, backend, lock):
+        """Sets the lock held by whatever sends input through a backend.
+
+        Backends aren't thread safe, so releaseAll holds the lock while
+        releasing a backend's inputs instead of sending them at the same
+        time as, e.g., a PlaybackScheduler flushing the same backend.
+
+        Args:
+            backend (InputBackend): Backend to guard.
+            lock (Lock): Lock held while sending input through the backend.
+        """
+        with self.lock:
+            self._guards[id(backend)] = lock
+
+    def press(self, backend, inputId, release):
+        """Records that an input was pressed.
+
+        Args:
+            backend (InputBackend): Backend the input was pressed with.
+            inputId (Object): Identifies the key or mouse button. See
+                            MacroCompiler.heldInput.
+            release (Tuple): (event_type, payload) that releases the input.
+        """
+        with self.lock:
+            _, inputs = self._held.setdefault(id(backend), (backend, {}))
+            entry = inputs.get(inputId)
+            if entry:
+                entry[1] += 1
+            else:
+                inputs[inputId] = [release, 1]
+
+    def release(self, backend, inputId):
+        """Records that an input was released.
+
+        Args:
+            backend (InputBackend): Backend the input was pressed with.
+            inputId (Object): Identifies the key or mouse button.
+        """
+        with self.lock:
+            held = self._held.get(id(backend))
+            if not held:
+                return
+            inputs = held[1]
+            entry = inputs.get(inputId)
+            if entry:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del inputs[inputId]
+            if not inputs:
+                del self._held[id(backend)]
+
+    def count(self):
+        """Returns the number of inputs currently held."""
+        with self.lock:
+            return sum(len(inputs) for _, inputs in self._held.values())
+
+    def releaseAll(self):
+        """Releases every held input, with one flush per backend.
+
+        Return: Number of inputs released.
+        """
+        with self.lock:
+            held = self._held
+            self._held = {}
+            guards = dict(self._guards)
+
+        released = 0
+        for key, (backend, inputs) in held.items():
+            with guards.get(key) or nullcontext():
+                for eventType, payload in (entry[0]
+                        for entry in inputs.values()):
+                    if eventType == EventEnum.KEY_UP:
+                        backend.keyUp(payload)
+                    else:
+                        backend.mouseButton(*payload)
+                    released += 1
+                backend.flush()
+        return released
+
+# Ledger shared by every macro in the program.
+heldInputs = HeldInputLedger()
+atexit.register(heldInputs.releaseAll)
@@ -23,6 +23,8 @@ class Hotkeys():
                           hotkey.
         currTotalTime (float): Total time to run the macro that will be mapped
                                to the currently recording hotkey.
+        currOptions (dict): Playback options of the macro that will be mapped
+                            to the currently recording hotkey.
         keyWatcher (KeyWatcher): Macro recorder that's used throughout the
                                  program.
         mapper (GlobalHotKeys): Pynput's GlobalHotKeys object to listen for 
@@ -43,6 +45,7 @@ class Hotkeys():
         self.currRecordSet = set()
         self.currSteps = None
         self.currTotalTime = 0
+        self.currOptions = None
         self.keyWatcher = keyWatcher
         self.mapper = keyboard.GlobalHotKeys({})
         self.hotkeyRecorder = None
@@ -76,7 +79,8 @@ class Hotkeys():
         self.savedHotkeys = None
 
     def recordHotkey(self, original=None, steps=None, totalTime=0, loopNum=0,
-            updater=lambda param: None, customFunc=lambda: None):
+            updater=lambda param: None, customFunc=lambda: None,
+            options=None):
         """Begins recording a hotkey.
 
         This function mainly sets up the state of the object while recording
@@ -97,11 +101,14 @@ class Hotkeys():
                             recording. This is generally used to update the GUI.
             customFunc (func): Function to map to the hotkey if this hotkey
                                is not being used for a macro.
+            options (dict): Playback options of the macro. See
+                            MacroCompiler.retimeSteps.
         """
 
         # Set up object state for when we finish recording the hotkey
         self.currSteps = steps
         self.currTotalTime = totalTime
+        self.currOptions = options
         self.savedHotkeys = self.mapper._hotkeys
         self.loopNum = loopNum
         self.mapper._hotkeys = []
@@ -146,6 +153,7 @@ class Hotkeys():
         self.currRecordSet = set()
         self.currSteps = None
         self.currTotalTime = None
+        self.currOptions = None
         self.hotkeyRecorder.stop()
 
         # I don't remember why this line is a thing but I'm sure it's for a
@@ -178,13 +186,16 @@ class Hotkeys():
             # -1 denotes that no such identical hotkey was found
             if idx != -1:
                 self.setHotkey(idx, self.currRecordSet, self.currSteps,
-                        self.currTotalTime, self.loopNum, customFunc)
+                        self.currTotalTime, self.loopNum, customFunc,
+                        options=self.currOptions)
             else:
                 self.addHotkey(self.currRecordSet, self.currSteps,
-                        self.currTotalTime, self.loopNum, customFunc)
+                        self.currTotalTime, self.loopNum, customFunc,
+                        options=self.currOptions)
         else:
             self.addHotkey(self.currRecordSet, self.currSteps,
-                    self.currTotalTime, self.loopNum, customFunc)
+                    self.currTotalTime, self.loopNum, customFunc,
+                    options=self.currOptions)
 
         # The updater was only needed for EditLabelKeySequence to update
         # state and GUI so this feels a little hacky / not generic.
@@ -193,7 +204,7 @@ class Hotkeys():
         self.finishRecording()
 
     def addHotkey(self, keys, steps=None, totalTime=0, loopNum=0,
-            customFunc=lambda: None, recording=True):
+            customFunc=lambda: None, recording=True, options=None):
         """Adds a new hotkey mapping to savedHotKeys or the mapper object.
 
         Args:
@@ -215,6 +226,8 @@ class Hotkeys():
                               For example, we would like to add hotkeys
                               to the mapper when we start up the application
                               and have read the saved hotkeys from disc.
+            options (dict): Playback options of the macro. See
+                            MacroCompiler.retimeSteps.
 
         """
         addTo = self.savedHotkeys if recording else self.mapper._hotkeys
@@ -222,7 +235,8 @@ class Hotkeys():
         # False, then that means this hotkey will not be used for a macro,
         # so we mapm the custom function instead.
         func = (lambda: self.keyWatcher._runMacro(steps, totalTime, loopNum, \
-                keys, self)) if steps and totalTime and loopNum else customFunc
+                keys, self, options)) if steps and totalTime and loopNum \
+                else customFunc
         hotkey = HotKey(keys, func)
         addTo.append(hotkey)
 
@@ -257,7 +271,7 @@ class Hotkeys():
         return -1
 
     def setHotkey(self, idx, keys, steps=None, totalTime=0, loopNum=0,
-            customFunc=lambda: None, recording=True):
+            customFunc=lambda: None, recording=True, options=None):
         """Replace the hotkey at idx in either savedHotkeys or the mapper.
 
         Args:
@@ -280,6 +294,8 @@ class Hotkeys():
                               changed the number of times the macro will loop
                               for, and want to replace it with a HotKey that
                               loops the macro the correct number of times.
+            options (dict): Playback options of the macro. See
+                            MacroCompiler.retimeSteps.
         """
         if idx < 0:
             print('Tried to set at -1 -> hotkey doesn\'t exist')
@@ -289,7 +305,8 @@ class Hotkeys():
         # False, then that means this hotkey will not be used for a macro,
         # so we map the custom function instead.
         func = (lambda: self.keyWatcher._runMacro(steps, totalTime, loopNum,
-                keys, self)) if steps and totalTime and loopNum else customFunc
+                keys, self, options)) if steps and totalTime and loopNum \
+                else customFunc
         hotkey = HotKey(keys, func)
         addTo[idx] = hotkey
 
@@ -306,7 +323,8 @@ class Hotkeys():
         keys = macro.getKeys()
         time = macro.getTime()
         idx = self.findHotkey(keys, recording=False)
-        self.setHotkey(idx, keys, newSteps, time, loopNum, recording=False)
+        self.setHotkey(idx, keys, newSteps, time, loopNum, recording=False,
+                options=macro.getOptions())
 
     def setMacroToggle(self, keys, toggleFunc):
         """Used to stop a macro if the macro was set to loop until hotkey press.
@@ -0,0 +1,183 @@
+"""File containing the interface every playback input backend implements.
+
+MacroRunner never sends input itself. Instead, it calls the methods of an
+InputBackend, which decides where the input actually goes. Win32Backend sends
+it to Windows, while RecordingBackend just keeps it in memory so playback can
+be measured and tested without a desktop.
+"""
+
+from collections import namedtuple
+import time
+
+KeyRecord = namedtuple('KeyRecord', ['vk', 'scan', 'extended', 'needsShift'])
+KeyRecord.__doc__ = """Everything needed to play back a key.
+
+Attributes:
+    vk (int): Virtual key code of the key.
+    scan (int): Scan code of the key.
+    extended (bool): Whether the key needs the extended key flag.
+    needsShift (bool): Whether shift needs to be held to type the key.
+"""
+
+class InputBackend():
+    """Base class for where played back input is sent.
+
+    Inputs don't have to be sent until flush is called, so a backend can
+    send all the inputs due at the same time together.
+    """
+
+    def keyTable(self):
+        """Returns the table used to translate keys when compiling a macro.
+
+        Return: Object with a lookup(key) method that returns the KeyRecord
+                of a key's string representation. See KeyTable.
+        """
+        raise NotImplementedError
+
+    def virtualScreen(self):
+        """Returns the bounds of the screen mouse coordinates are in.
+
+        Return: Tuple formatted as (left, top, width, height).
+        """
+        raise NotImplementedError
+
+    def keyDown(self, record):
+        """Presses a key.
+
+        Args:
+            record (KeyRecord): Key to press.
+        """
+        raise NotImplementedError
+
+    def keyUp(self, record):
+        """Releases a key.
+
+        Args:
+            record (KeyRecord): Key to release.
+        """
+        raise NotImplementedError
+
+    def mouseMove(self, dx, dy):
+        """Moves the mouse.
+
+        Args:
+            dx (int): Absolute x coordinate to move to. See
+                      KeyboardController.toAbsolute.
+            dy (int): Absolute y coordinate to move to.
+        """
+        raise NotImplementedError
+
+    def mouseButton(self, dx, dy, flags):
+        """Presses or releases a mouse button.
+
+        Args:
+            dx (int): Absolute x coordinate to move to first if flags contains
+                      MOUSEEVENTF_MOVE_ABSOLUTE.
+            dy (int): Absolute y coordinate to move to first if flags contains
+                      MOUSEEVENTF_MOVE_ABSOLUTE.
+            flags (int): MOUSEEVENTF flags describing which button to press or
+                         release. See KeyboardController.
+        """
+        raise NotImplementedError
+
+    def scroll(self, ticks):
+        """Scrolls vertically.
+
+        Args:
+            ticks (int): Number of ticks to scroll. Positive scrolls up.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Sends every input that hasn't been sent yet."""
+        raise NotImplementedError
+
+class _NameTable():
+    """Key table that gives every key a made up code the first time it's seen.
+
+    Attributes:
+        records (dict): Mapping of a key's string representation to its
+                        KeyRecord.
+        names (dict): Mapping of a made up code to the key's string
+                      representation.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.names = {}
+
+    def lookup(self, key):
+        """Returns the KeyRecord of a key, making one if needed."""
+        record = self.records.get(key)
+        if record is None:
+            code = len(self.records) + 1
+            record = KeyRecord(code, code, False, False)
+            self.records[key] = record
+            self.names[code] = key
+        return record
+
+    def nameOf(self, code):
+        return self.names.get(code)
+
+class RecordingBackend(InputBackend):
+    """Backend that keeps every input in memory instead of sending it.
+
+    Attributes:
+        events (list): Every input received as (timestamp, kind, data) tuples
+                       where kind is the name of the method that received it.
+        flushes (int): Number of times flush was called with inputs waiting.
+        clock (func): Function returning the timestamp to record.
+        screen (Tuple): Bounds returned by virtualScreen.
+        table (_NameTable): Table returned by keyTable. Its nameOf method
+                            converts recorded key codes back to names.
+    """
+
+    def __init__(self, clock=time.perf_counter, screen=(0, 0, 1920, 1080)):
+        """Initializes instance variables.
+
+        Args:
+            clock (func): Function returning the timestamp to record.
+            screen (Tuple): Bounds returned by virtualScreen.
+        """
+        self.events = []
+        self.flushes = 0
+        self.clock = clock
+        self.screen = screen
+        self.table = _NameTable()
+        self._pending = 0
+
+    def _record(self, kind, data):
+        self.events.append((self.clock(), kind, data))
+        self._pending += 1
+
+    def keyTable(self):
+        return self.table
+
+    def virtualScreen(self):
+        return self.screen
+
+    def keyDown(self, record):
+        self._record('keyDown', record)
+
+    def keyUp(self, record):
+        self._record('keyUp', record)
+
+    def mouseMove(self, dx, dy):
+        self._record('mouseMove', (dx, dy))
+
+    def mouseButton(self, dx, dy, flags):
+        self._record('mouseButton', (dx, dy, flags))
+
+    def scroll(self, ticks):
+        self._record('scroll', ticks)
+
+    def flush(self):
+        if self._pending:
+            self.flushes += 1
+            self._pending = 0
+
+    def clear(self):
+        """Forgets every recorded input."""
+        self.events = []
+        self.flushes = 0
+        self._pending = 0
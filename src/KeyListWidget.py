@@ -26,7 +26,7 @@ class KeyListWidget(QListWidget):
                           The data in the lists are as follows:
 
                           [macro_name, steps, total_time,
-                          hotkey_keys, hotkey_string, loop_num]
+                          hotkey_keys, hotkey_string, loop_num, options]
 
                           macro_name (str): Name of the macro.
                           steps (list): List of the macro's steps.
@@ -36,9 +36,15 @@ class KeyListWidget(QListWidget):
                           hotkey_string (str): String representation of the
                                                hotkeys.
                           loop_num (int): Number of times to loop the macro.
+                          options (dict): Playback options of the macro. See
+                                          MacroCompiler.retimeSteps.
          
         stepContainers (list): List of KeyListWidgetStep objects from the
                                 currently focused macro.
+        recordedSteps (list): Steps recorded since recording began, each
+                              formatted as a list of the same fields as a
+                              parsed step. Recording only updates these, and
+                              they're displayed in batches by renderSteps.
         parsedSteps (list): List tuples containing the data of steps to perform.
                             for the currently focused macro.
         keyWatcher (KeyWatcher): Macro recorder used throughout the program.
@@ -48,21 +54,17 @@ class KeyListWidget(QListWidget):
         loopNum (int): Number of times to loop the currently focused macro.
 
     Class Attributes:
-        keyPress (Signal): Signal for when keys are pressed.
-        keyRelease (Signal): Signal for when keys are released.
-        mousePress (Signal): Signal for when the mouse is clicked or released.
-        mouseScroll (Signal): Signal for when the scroll wheel is scrolled.
-        wait (Signal): Signal for when the user isn't doing anything.
+        inputReady (Signal): Signal for when the input hooks have recorded
+                             input that hasn't been drained yet.
     """
-    keyPress = pyqtSignal(float, object)
-    keyRelease = pyqtSignal(float, object)
-    mousePress = pyqtSignal(float, float, float, object, bool)
-    mouseScroll = pyqtSignal(float, float, float, float, float)
-    wait = pyqtSignal(float)
+    inputReady = pyqtSignal()
 
     # index, stepType, data, dataIdx, time, startTime
     stepUpdate = pyqtSignal(int, object, object, int, float, float)
 
+    # Format of the hold times of recorded steps.
+    HOLD_FORMAT = '%.3f'
+
     def __init__(self, parent=None):
         """Initializes instance variables.
         
@@ -79,7 +81,10 @@ class KeyListWidget(QListWidget):
         self.recorder = None
         self.currFocusIndex = 0
         self.loopNum = 0
+        self.recordedSteps = []
         self.stepUpdate.connect(self._stepChange)
+        self._recordBase = 0
+        self._dirty = set()
 
     def setKeyWatcher(self, watcher):
         self.keyWatcher = watcher
@@ -148,6 +153,91 @@ class KeyListWidget(QListWidget):
         self.stepContainers.append(container)
         return container
 
+    def beginRecording(self):
+        """Starts keeping recorded steps in recordedSteps."""
+        self.recordedSteps = []
+        self._recordBase = len(self.stepContainers)
+        self._dirty = set()
+
+    def addRecordedStep(self, startTime, stepType, data=None):
+        """Adds a step to recordedSteps without displaying it.
+
+        Args:
+            startTime (float): Time in the macro time frame to begin exectuing
+                               this step.
+            stepType (StepEnum): Type of this step.
+            data (Tuple | float): Data describing how to execute this step.
+
+        Return: Index of the step in recordedSteps.
+        """
+        self.recordedSteps.append([stepType, data, 0, startTime])
+        return len(self.recordedSteps) - 1
+
+    def updateRecordedStep(self, idx, stepType=None, data=None,
+            holdTime=None):
+        """Changes a recorded step.
+
+        The step is only displayed again by renderSteps if something
+        actually changed.
+
+        Args:
+            idx (int): Index of the step in recordedSteps.
+            stepType (StepEnum): New type of the step. None to leave it.
+            data (Tuple | float): New data of the step. None to leave it.
+            holdTime (float): New hold time of the step. None to leave it.
+        """
+        step = self.recordedSteps[idx]
+        old = list(step)
+        if stepType is not None:
+            step[0] = stepType
+        if data is not None:
+            step[1] = data
+        if holdTime is not None:
+            step[2] = holdTime
+        if step != old:
+            self._dirty.add(idx)
+
+    def renderSteps(self, everything=False):
+        """Displays recorded steps that are new or changed since last time.
+
+        Args:
+            everything (bool): Whether to update every recorded step that's
+                               displayed, changed or not.
+        """
+        steps = self.recordedSteps
+        base = self._recordBase
+        rendered = len(self.stepContainers) - base
+        dirty, self._dirty = self._dirty, set()
+        if everything:
+            dirty = range(rendered)
+        for idx in dirty:
+            if idx < rendered:
+                self._renderStep(self.stepContainers[base + idx], steps[idx])
+        for step in steps[rendered:]:
+            stepType, data, _, startTime = step
+            self._renderStep(self.listWidgetAddStep(startTime, stepType,
+                    data), step)
+
+    def _renderStep(self, container, step):
+        """Updates a step widget to match a recorded step.
+
+        Args:
+            container (KeyListWidgetStep): Widget displaying the step.
+            step (list): The recorded step.
+        """
+        stepType, data, holdTime, _ = step
+        if container.getStepType() != stepType:
+            # Clicks are the only steps that change type while recording.
+            container.clickToDrag(container.getStepType(), *data)
+        elif stepType == StepEnum.MOUSE_SCROLL:
+            container.getEditable().setText(str(data))
+        container.getPress().setText(KeyListWidget.HOLD_FORMAT % holdTime)
+
+    def endRecording(self):
+        """Displays every recorded step and stops keeping recordedSteps."""
+        self.renderSteps(everything=True)
+        self.recordedSteps = []
+
     def parseSteps(self):
         """Serializes each of the step widgets in stepContainers.
         
@@ -182,7 +272,8 @@ class KeyListWidget(QListWidget):
                 self.currFocusIndex = idx
 
             backup = [macro.getMacroName(), macro.getSteps(), macro.getTime(),
-                    macro.getKeys(), macro.getKeyString(), macro.getLoopNum()]
+                    macro.getKeys(), macro.getKeyString(), macro.getLoopNum(),
+                    macro.getOptions()]
             writable.append(backup)
         return writable
         
@@ -202,7 +293,7 @@ class KeyListWidget(QListWidget):
         currMacro[2] = time
 
     def reloadMacro(self, name, steps, time, keys, keyString,
-            loopNum):
+            loopNum, options=None):
         """Creates and displays a macro widget.
 
         Args:
@@ -214,10 +305,12 @@ class KeyListWidget(QListWidget):
             keyString (str): String representation of the
                              hotkeys.
             loopNum (int): Number of times to loop the macro.
+            options (dict): Playback options of the macro. See
+                            MacroCompiler.retimeSteps.
         """
         item = QListWidgetItem()
         container = KeyListWidgetMacro(self.recorder, self, name, steps,
-                time, keys, keyString, loopNum)
+                time, keys, keyString, loopNum, options)
         self.macroWidgets.append(container)
         self._finalizeItem(item, container)
 
@@ -225,8 +318,8 @@ class KeyListWidget(QListWidget):
         """Re-displays the previously backed up macro widgets."""
         self.clear()
         self.stepContainers = []
-        for name, steps, time, keys, keyString, loopNum in self.macroList:
-            self.reloadMacro(name, steps, time, keys, keyString, loopNum)
+        for macro in self.macroList:
+            self.reloadMacro(*macro)
         self.macroList = []
         self.currFocus = None
 
@@ -49,8 +49,11 @@ class KeyListWidgetMacro(KeyListWidgetContainer):
     displaying a Macro's steps).
     """
 
+    # Speeds selectable for each macro.
+    _SPEEDS = ['0.5x', '1x', '2x', '5x', '10x']
+
     def __init__(self, recorder, listWidget, text, steps=None, time=0,
-            keys=None, keyString='', loopNum=0):
+            keys=None, keyString='', loopNum=0, options=None):
         """Gathers and laysout all the components of the macro widget.
 
         Args:
@@ -67,6 +70,8 @@ class KeyListWidgetMacro(KeyListWidgetContainer):
             keys (set): Set of KeyCodes that, when pressed, run this macro.
             keyString (str): String representation of keys.
             loopNum (int): Number of times to loop this macro.
+            options (dict): Playback options of this macro. See
+                            MacroCompiler.retimeSteps.
         """
 
         # Initialize widgets that will be displayed in the container widget.
@@ -74,9 +79,11 @@ class KeyListWidgetMacro(KeyListWidgetContainer):
         editLabel = EditLabelLine(text)
         loopText = QLabel("Loop:")
         loopSelector = QComboBox()
+        speedText = QLabel("Speed:")
+        speedSelector = QComboBox()
 
         macroWidget = MacroWidget(listWidget, keyEdit, editLabel, loopSelector,
-                time)
+                speedSelector, time)
         super().__init__(macroWidget)
 
         if keys:
@@ -92,6 +99,17 @@ class KeyListWidgetMacro(KeyListWidgetContainer):
         loopSelector.setCurrentIndex(loopNum - 1 if loopNum > 0 else
                 len(comboItems) - 1)
 
+        # Options must be set before the speed is selected, since selecting
+        # it updates them.
+        options = dict(options or {})
+        macroWidget.setOptions(options)
+        speed = f'{options.get("speed", 1):g}x'
+        speedItems = list(KeyListWidgetMacro._SPEEDS)
+        if speed not in speedItems:
+            speedItems.append(speed)
+        speedSelector.addItems(speedItems)
+        speedSelector.setCurrentText(speed)
+
         # Begin laying everything out
         hLayout = QHBoxLayout()
         hLayout.addWidget(editLabel)
@@ -102,6 +120,8 @@ class KeyListWidgetMacro(KeyListWidgetContainer):
         hLayout.addStretch()
         hLayout.addWidget(loopText)
         hLayout.addWidget(loopSelector)
+        hLayout.addWidget(speedText)
+        hLayout.addWidget(speedSelector)
         self.container.setLayout(hLayout)
 
         # Set member variables of the container.
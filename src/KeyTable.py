@@ -0,0 +1,181 @@
+"""File containing the key translation table used for playback.
+
+Translating a key's string representation into something we can send with
+SendInput takes a few Win32 calls. Instead of making these calls every time
+a key is played back, every key is translated once per keyboard layout and
+stored in a table.
+"""
+
+from StepConstants import keyNames, keyConst, keyToVK
+from win32api import GetKeyboardLayout, MapVirtualKey, VkKeyScanEx
+from win32process import GetWindowThreadProcessId
+import pynput._util.win32_vks as VK
+from win32gui import GetForegroundWindow
+from InputBackend import KeyRecord
+from threading import Lock
+import string
+
+# Keys which share their scan codes with other keys and are told apart by
+# the extended key flag.
+_EXTENDED_VKS = {
+    VK.RMENU, VK.RCONTROL, VK.LWIN, VK.RWIN, VK.APPS,
+    VK.INSERT, VK.DELETE, VK.HOME, VK.END, VK.PRIOR, VK.NEXT,
+    VK.LEFT, VK.RIGHT, VK.UP, VK.DOWN,
+    VK.NUMLOCK, VK.SNAPSHOT, VK.DIVIDE,
+    VK.VOLUME_MUTE, VK.VOLUME_DOWN, VK.VOLUME_UP,
+    VK.MEDIA_NEXT_TRACK, VK.MEDIA_PREV_TRACK, VK.MEDIA_PLAY_PAUSE,
+}
+
+# Printable characters minus whitespace other than space.
+_CHARACTERS = string.printable[:-5]
+
+# Mapping of keyboard layout -> translation table for that layout.
+_tables = {}
+_tableLock = Lock()
+
+# Table of the layout last read by refreshLayout.
+_current = None
+
+def activeLayout():
+    """Returns the keyboard layout of the window in focus."""
+    threadId, _ = GetWindowThreadProcessId(GetForegroundWindow())
+    return GetKeyboardLayout(threadId)
+
+class KeyTable():
+    """Translation table for a single keyboard layout.
+
+    Attributes:
+        layout (int): Keyboard layout the table translates with.
+        records (dict): Mapping of a key's string representation (a single
+                        character or the name of a key in StepConstants) to
+                        its KeyRecord.
+        chars (dict): Mapping of every virtual key code -> the unshifted
+                      character it types, or '\0' if it doesn't type one.
+    """
+
+    def __init__(self, layout):
+        """Translates every printable character and named key.
+
+        Args:
+            layout (int): Keyboard layout to translate with.
+        """
+        self.layout = layout
+        self.records = {}
+        self.chars = {}
+        for char in _CHARACTERS:
+            self._addChar(char)
+        for name in keyNames():
+            key = keyConst(name)
+            vk = keyToVK(key)
+            # Not every key has an entry in StepConstants' virtual key
+            # mapping.
+            if not isinstance(vk, int):
+                vk = key.value.vk
+            self.records[name] = self._vkRecord(vk)
+
+        # Keys that aren't printable characters (e.g. the numpad) map to
+        # whatever Windows says they type. The top bit marks dead keys.
+        for vk in range(256):
+            if vk not in self.chars:
+                self.chars[vk] = chr(MapVirtualKey(vk, 2, layout) & 0xFFFF)
+
+    def _vkRecord(self, vk, needsShift=False):
+        """Creates the key record for a virtual key code.
+
+        Args:
+            vk (int): Virtual key code to translate.
+            needsShift (bool): Whether shift needs to be held to type the key.
+
+        Return: The KeyRecord for the key.
+        """
+        return KeyRecord(vk, MapVirtualKey(vk, 0, self.layout),
+                vk in _EXTENDED_VKS, needsShift)
+
+    def _addChar(self, char):
+        """Translates a character and adds it to the table.
+
+        Args:
+            char (str): Character to translate.
+
+        Return: The KeyRecord for the character or None if the character
+                can't be typed with this layout.
+        """
+        res = VkKeyScanEx(char, self.layout)
+        # VkKeyScanEx returns -1 in both bytes if there's no translation.
+        if res & 0xFFFF == 0xFFFF:
+            return None
+        record = self._vkRecord(res & 0xFF, needsShift=bool((res >> 8) & 1))
+        self.records[char] = record
+        if not record.needsShift:
+            self.chars.setdefault(record.vk, char)
+        return record
+
+    def lookup(self, key):
+        """Looks up the KeyRecord of a key.
+
+        Characters outside of the printable ones (e.g. accented letters)
+        aren't in the table to start with, so they're translated and added
+        the first time they're looked up.
+
+        Args:
+            key (str): A single character or the name of a key in
+                       StepConstants.
+
+        Return: The key's KeyRecord or None if it can't be typed.
+        """
+        record = self.records.get(key)
+        if record is None and len(key) == 1:
+            record = self._addChar(key)
+        return record
+
+    def vkToChar(self, vk):
+        """Returns the unshifted character a virtual key code types.
+
+        Args:
+            vk (int): Virtual key code to translate.
+
+        Return: The character, '\0' if the key doesn't type a character or
+                None if vk isn't a virtual key code.
+        """
+        return self.chars.get(vk)
+
+def keyTable(layout=None):
+    """Returns the translation table for a keyboard layout.
+
+    Tables are only built the first time they're needed for a layout, so
+    this only rebuilds anything when the layout changes.
+
+    Args:
+        layout (int): Keyboard layout to get the table for. Defaults to the
+                      active layout.
+
+    Return: The KeyTable for the layout.
+    """
+    layout = activeLayout() if layout is None else layout
+    table = _tables.get(layout)
+    if table is None:
+        with _tableLock:
+            table = _tables.get(layout)
+            if table is None:
+                table = KeyTable(layout)
+                _tables[layout] = table
+    return table
+
+def refreshLayout():
+    """Reads the active keyboard layout again and makes its table current.
+
+    Return: The KeyTable for the active layout.
+    """
+    global _current
+    _current = keyTable(activeLayout())
+    return _current
+
+def currentTable():
+    """Returns the table of the layout last read by refreshLayout.
+
+    Unlike keyTable(), this doesn't ask Windows which layout is active, so
+    it's cheap enough to call for every recorded key.
+
+    Return: The current KeyTable.
+    """
+    return _current if _current is not None else refreshLayout()
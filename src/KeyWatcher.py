@@ -2,13 +2,25 @@
 
 from StepEvents import KeyboardEvent, ClickEvent, WaitEvent, ScrollEvent
 from win32gui import PostQuitMessage
+from Win32Backend import Win32Backend
 from MacroRunner import MacroRunner
+from Scheduler import PlaybackScheduler
+from PlaybackProcess import PlaybackProcess
+from HeldInputs import heldInputs
+from AppConfig import AppConfig
 from StepConstants import StepEnum
+from RingBuffer import RingBuffer
+from KeyTable import refreshLayout
 from pynput import mouse, keyboard
 from pynput.keyboard import HotKey
-from threading import Thread, Lock
+from PyQt5.QtCore import QTimer, Qt
+from threading import Lock, Thread
+from queue import SimpleQueue
+from Clock import defaultClock
 from util import synchronize
-import time
+from operator import itemgetter
+from heapq import merge
+import traceback
 
 class KeyWatcher():
     """Class to record macros.
@@ -16,6 +28,12 @@ class KeyWatcher():
     Upon initializing this class, the keyboard listeners and mouse listeners,
     which are Thread objects, will start.
 
+    While recording, the listeners only timestamp each input and push it
+    into their own RingBuffer as a (timestamp, handler, args) record, where
+    handler is the StepEvent callback that turns it into a step. The GUI
+    thread is signalled once per batch, and drains both buffers in the order
+    the input happened.
+
     Attributes:
         listWidget (KeyListWidget): The sole list widget displayed in the
                                     program.
@@ -23,17 +41,14 @@ class KeyWatcher():
                                     takes.
         recordStartTime (float): Time when macro began recording.
         recordTotalTime (float): Time it took to run the macro
-        startTime (float): Current time passed since macro recording 
-                           started. Used to denote when we began 
-                           recording a step.
+        idleSince (float): Clock time the user last stopped doing anything.
+                           Used as the start of active wait steps.
         recording (bool): Whether or not we are currently recording a macro.
         keysDown (dict): Mapping of keys currently pressed
                          (or if scrolling / clicking) to a tuple containing
-                         their time held display and the time they were 
-                         detected.
-        lock (Lock): Threading lock to prevent race conditions in the keysDown
-                     dict which can happen between the display updater thread
-                     and the listener threads.
+                         the index of their recorded step, the time they
+                         were detected and their step type.
+        lock (Lock): Threading lock guarding the keysDown dict.
         keyboardEvent (KeyboardEvent): Class containing event listeners for 
                                        the keyboard.
         clickEvent (ClickEvent): Class containing event listeners for mouse
@@ -44,10 +59,36 @@ class KeyWatcher():
                                    events.
         keyboard (Listener): Keyboard listener thread.
         mouse (Listener): Mouse listener thread.
-        updater (Thread): Thread used to update hold time for each step in the
-                          list widget.
+        refreshTimer (QTimer): Timer on the GUI thread that refreshes the hold
+                               time of each held step and displays what
+                               changed while recording.
+        waitTimer (QTimer): Single shot timer armed for when the user will
+                            have been idle long enough to add an active wait
+                            step. Re-armed or stopped by new input.
+        scrollTimer (QTimer): Single shot timer armed for when the user will
+                              have stopped scrolling long enough to finish
+                              the scroll step. Re-armed by new scrolls.
+        clock (RealClock): Clock used to time recording and playback.
+        scheduler (PlaybackScheduler): Plays back every macro that's run. Only
+                                       created once the config is read.
+        backend (Win32Backend): Backend every macro is played back with, so
+                                macros running at the same time share one
+                                batch of input.
+        engine (PlaybackProcess): Child process every macro is played back
+                                  in when the separateProcess option is
+                                  set. Only started once the config is
+                                  read.
+        playbackQueue (SimpleQueue): (func, args) tuples for the playback
+                                     worker to call, so hotkeys don't do
+                                     anything slow on the hook's thread.
+        playbackWorker (Thread): Thread that compiles and starts every macro
+                                 run by a hotkey.
+        keyboardBuffer (RingBuffer): Records pushed by the keyboard listener.
+        mouseBuffer (RingBuffer): Records pushed by the mouse listener.
+        keysPressed (set): Keys the user is currently holding down. Used to
+                           detect the panic shortcut.
     """
-    def __init__(self, listWidget, totalTimeDisp):
+    def __init__(self, listWidget, totalTimeDisp, clock=defaultClock):
         """Initializes instance variables, and connects and starts listeners.
 
         Args:
@@ -55,23 +96,44 @@ class KeyWatcher():
                                         program.
             totalTimeDisp (QLCDNumber): Widget to display total time this macro
                                         takes.
+            clock (RealClock): Clock used to time recording and playback.
         """
         self.listWidget = listWidget
         self.totalTimeDisp = totalTimeDisp
         self.recordStartTime = 0
         self.recordTotalTime = 0
-        self.startTime = 0
+        self.idleSince = 0
         self.recording = False
         self.keysDown = dict()
         self.lock = Lock()
-
-        self.keyController = keyboard.Controller()
-        self.mouseController = mouse.Controller()
-
-        self.keyboardEvent = KeyboardEvent(listWidget, self.keysDown, self.lock)
-        self.clickEvent = ClickEvent(listWidget, self.keysDown, self.lock)
-        self.waitEvent = WaitEvent(listWidget, self.keysDown, self.lock)
-        self.scrollEvent = ScrollEvent(0, listWidget, self.keysDown, self.lock)
+        self.clock = clock
+        self.scheduler = None
+        self.backend = None
+        self.engine = None
+        self.keysPressed = set()
+        self.refreshTimer = QTimer()
+        self.refreshTimer.timeout.connect(self._refresh)
+        self._fastRecord = False
+        self.waitTimer = self._deadlineTimer(self._onWaitTimeout)
+        self.scrollTimer = self._deadlineTimer(self._onScrollTimeout)
+
+        self.keyboardEvent = KeyboardEvent(listWidget, self.keysDown, self.lock,
+                clock)
+        self.clickEvent = ClickEvent(listWidget, self.keysDown, self.lock,
+                clock)
+        self.waitEvent = WaitEvent(listWidget, self.keysDown, self.lock, clock)
+        self.scrollEvent = ScrollEvent(0, listWidget, self.keysDown, self.lock,
+                clock)
+
+        self.playbackQueue = SimpleQueue()
+        self.playbackWorker = Thread(target=self._playbackWorker,
+                daemon=True)
+        self.playbackWorker.start()
+
+        self.keyboardBuffer = RingBuffer()
+        self.mouseBuffer = RingBuffer()
+        self._overflows = 0
+        listWidget.inputReady.connect(self._drainInput)
 
         self.keyboard = keyboard.Listener(on_press=self.onPressEmit, 
                 on_release=self.onReleaseEmit)
@@ -86,8 +148,43 @@ class KeyWatcher():
         """Synchonously clears the keysDown dict."""
         self.keysDown.clear()
 
-    def _runMacro(self, steps, time, loopNum, keys, recorder):
-        """Runs a macro represented by the passed in data.
+    def startPlayback(self):
+        """Starts whatever plays back macros, so running one doesn't have to.
+
+        Called once the config has been read. The in process scheduler is
+        always started, since it's also the fallback if the playback process
+        dies.
+        """
+        playback = AppConfig.config['playback']
+        self.scheduler = PlaybackScheduler(playback['spinThreshold'],
+                self.clock)
+        self.backend = Win32Backend()
+        if playback['separateProcess']:
+            self.engine = PlaybackProcess(Win32Backend,
+                    playback['spinThreshold'])
+
+    def _runMacro(self, steps, time, loopNum, keys, recorder, options=None):
+        """Queues a macro for the playback worker to run.
+
+        Called by hotkeys, which on Windows run inside the low level keyboard
+        hook. Compiling a big macro takes longer than Windows lets the hook
+        take before dropping it, so that's left to the worker. See
+        _startMacro for the arguments.
+        """
+        self.playbackQueue.put((self._startMacro, (steps, time, loopNum, keys,
+                recorder, options)))
+
+    def _playbackWorker(self):
+        """Runs whatever is queued in playbackQueue, one at a time."""
+        while True:
+            func, args = self.playbackQueue.get()
+            try:
+                func(*args)
+            except Exception:
+                traceback.print_exc()
+
+    def _startMacro(self, steps, time, loopNum, keys, recorder, options=None):
+        """Compiles a macro and starts playing it back.
 
         Args:
             steps (List): List of tuples containing the data of each step.
@@ -97,11 +194,31 @@ class KeyWatcher():
             keys (set): Set of KeyCodes which make up the hotkey that maps
                         to this macro.
             recorder (Hotkeys): Hotkey recorder used throughout the program.
+            options (dict): Playback options of this macro. See
+                            MacroCompiler.retimeSteps.
 
+        Return: The MacroRunner (or RemoteRunner) playing back the macro,
+                which can be used to stop, pause or resume it.
         """
-        runner = MacroRunner(steps, time, loopNum, self.mouseController, 
-                self.keyController, keys, recorder)
+        playback = AppConfig.config['playback']
+
+        # If the child process died, it's restarted by the engine. Until it's
+        # back, macros are played back in process.
+        if self.engine is not None and self.engine.is_alive():
+            try:
+                return self.engine.play(steps, time, loopNum, keys,
+                        recorder, playback, options=options)
+            except OSError:
+                traceback.print_exc()
+
+        runner = MacroRunner(steps, time, loopNum, keys, recorder,
+                self.backend,
+                repeatDelay=playback['repeatDelay'],
+                repeatRate=playback['repeatRate'], options=options,
+                scheduler=self.scheduler, dragRate=playback['dragRate'],
+                latency=playback['latency'])
         runner.start()
+        return runner
 
     def setRecordTotalTime(self, time):
         self.recordTotalTime = time
@@ -114,39 +231,46 @@ class KeyWatcher():
     def toggleRecord(self, record):
         """Toggles the recording state.
 
-        If we begin recording, also start the updater thread.
+        If we begin recording, also start the refresh timer.
 
         Args:
             record (bool): Whether or not to start recording.
         """
         if record:
             self.scrollEvent.reset(0)
+            self.listWidget.beginRecording()
 
-            # Connect the list widget signals to update the widget on
-            # the appropriate events.
-            self.listWidget.keyPress.connect(self.keyboardEvent.onPress)
-            self.listWidget.keyRelease.connect(self.keyboardEvent.onRelease)
-            self.listWidget.mousePress.connect(self.clickEvent.onClick)
-            self.listWidget.wait.connect(self.waitEvent.onWait)
-            self.listWidget.mouseScroll.connect(self.scrollEvent.onScroll)
+            # Recorded virtual key codes are translated with the layout
+            # active when recording starts.
+            refreshLayout()
 
             # Stop listening for hotkeys while recording.
             self.listWidget.getCurrFocus().getRecorder().backupHotkeys()
 
             # update relavent instance variables
-            self.recordStartTime = time.time()
+            self.recordStartTime = self.clock.now()
             self.recording = True
-            self.updater = Thread()
-            self.startUpdater()
+            recording = AppConfig.config['recording']
+            self._fastRecord = recording['fastRecord']
+            self.refreshTimer.start(round(1000 / recording['refreshRate']))
+            self._armIdle(self.recordStartTime)
         else:
 
-            # Disconnect functions from list widget signals
-            # so we no longer add steps on each event.
-            self.listWidget.keyPress.disconnect()
-            self.listWidget.keyRelease.disconnect()
-            self.listWidget.mousePress.disconnect()
-            self.listWidget.wait.disconnect()
-            self.listWidget.mouseScroll.disconnect()
+            # Stop the listeners from recording, then add the steps for
+            # whatever they recorded that hasn't been drained yet.
+            self.recording = False
+            self._drainInput()
+            self.refreshTimer.stop()
+            self.waitTimer.stop()
+            self.scrollTimer.stop()
+            self.scrollEvent.finish()
+            overflows = self.getOverflows()
+            if overflows > self._overflows:
+                print(f'Dropped {overflows - self._overflows} inputs while '
+                        'recording')
+                self._overflows = overflows
+
+            self.listWidget.endRecording()
 
             currFocus = self.listWidget.getCurrFocus()
             recorder = currFocus.getRecorder()
@@ -159,10 +283,8 @@ class KeyWatcher():
             # would begin recording again.
             self.listWidget.removeLast()
 
-            # Stop updater (probably could've just self.updater.stop())
-            self.recording = False
             self._clearRecordState()
-            newTotalTime = time.time() - self.recordStartTime
+            newTotalTime = self.clock.now() - self.recordStartTime
 
             # If recordTotalTime is 0, then we can just set the total time
             # to the recently recorded total time, otherwise, we are recording
@@ -184,11 +306,12 @@ class KeyWatcher():
             parsedSteps = self.listWidget.getParsedSteps()
             if idx == -1:
                 recorder.addHotkey(hotkey, parsedSteps, self.recordTotalTime,
-                        self.getLoopNum(), recording=False)
+                        self.getLoopNum(), recording=False,
+                        options=currFocus.getOptions())
             else:
                 recorder.setHotkey(idx, hotkey, parsedSteps,
                         self.recordTotalTime, self.listWidget.getLoopNum(),
-                        recording=False)
+                        recording=False, options=currFocus.getOptions())
 
             currFocus.setSteps(parsedSteps)
             currFocus.setTime(self.recordTotalTime)
@@ -202,26 +325,140 @@ class KeyWatcher():
         """
         return lambda self, key: func(self, self.keyboard.canonical(key))
 
+    def _push(self, buffer, timestamp, handler, *args):
+        """Hands input over to the GUI thread if we're recording.
+
+        Args:
+            buffer (RingBuffer): Buffer of the listener the input came from.
+            timestamp (float): Clock time the listener saw the input at.
+                               Taken first thing in every listener callback,
+                               so steps start when their input happened.
+            handler (func): StepEvent callback to add the step with.
+            *args: Arguments passed to the handler after the times.
+        """
+        if self.recording and buffer.push((timestamp, handler, args)):
+            self.listWidget.inputReady.emit()
+
+    def getOverflows(self):
+        """Returns how many inputs were dropped because a buffer was full."""
+        return self.keyboardBuffer.overflows + self.mouseBuffer.overflows
+
+    def _drainInput(self):
+        """Adds a step for everything the listeners have recorded.
+
+        Runs on the GUI thread.
+        """
+        offset = self.recordTotalTime - self.recordStartTime
+        timestamp = None
+        for timestamp, handler, args in merge(self.keyboardBuffer.drain(),
+                self.mouseBuffer.drain(), key=itemgetter(0)):
+            handler(timestamp + offset, timestamp, *args)
+        if timestamp is None or not self.recording:
+            return
+
+        # Whatever was drained last is the latest input, so the timers are
+        # armed from it.
+        if StepEnum.MOUSE_SCROLL in self.keysDown:
+            self._armAt(self.scrollTimer, self.scrollEvent.stopStart +
+                    AppConfig.config['recording']['scrollThreshold'])
+        if self.keysDown:
+            self.waitTimer.stop()
+        else:
+            self._armIdle(timestamp)
+
+    def _deadlineTimer(self, func):
+        """Returns a single shot timer that calls the passed in function."""
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.setTimerType(Qt.PreciseTimer)
+        timer.timeout.connect(func)
+        return timer
+
+    def _armAt(self, timer, deadline):
+        """(Re)starts a timer so it fires at the passed in clock time."""
+        timer.start(max(0, round((deadline - self.clock.now()) * 1000)))
+
+    def _armIdle(self, since):
+        """Arms the wait timer for the user being idle since a clock time."""
+        self.idleSince = since
+        self._armAt(self.waitTimer, since +
+                AppConfig.config['recording']['waitThreshold'])
+
+    def _onWaitTimeout(self):
+        """Adds an active wait step once the user has been idle long enough.
+
+        Input the listeners recorded but that hasn't been drained yet is
+        drained first, so it isn't mistaken for being idle.
+        """
+        self._drainInput()
+        deadline = self.idleSince + \
+                AppConfig.config['recording']['waitThreshold']
+        if not self.recording or self.keysDown:
+            return
+        if deadline > self.clock.now():
+            self._armAt(self.waitTimer, deadline)
+            return
+        self.waitEvent.onWait(self.idleSince - self.recordStartTime +
+                self.recordTotalTime, self.idleSince)
+
+    def _onScrollTimeout(self):
+        """Finishes the scroll step once the user has stopped scrolling."""
+        self._drainInput()
+        if not self.recording or StepEnum.MOUSE_SCROLL not in self.keysDown:
+            return
+        lastScroll = self.scrollEvent.stopStart
+        deadline = lastScroll + \
+                AppConfig.config['recording']['scrollThreshold']
+        if deadline > self.clock.now():
+            self._armAt(self.scrollTimer, deadline)
+            return
+        self.scrollEvent.finish()
+        if not self.keysDown:
+            self._armIdle(lastScroll)
+
     @canonize
     def onPressEmit(self, key):
-        """Emits signal to listWidget to update with key press step.
+        """Hands a key press step over to listWidget.
+
+        Also has the playback worker panic if the panic shortcut was
+        pressed.
         
         Args:
             key (KeyCode): Key pressed.
         """
-        self.listWidget.keyPress.emit(self.startTime, key)
+        timestamp = self.clock.nowNs() / 1e9
+        self.keysPressed.add(key)
+        panicKeys = AppConfig.panicKeys
+        if panicKeys and panicKeys <= self.keysPressed:
+            self.playbackQueue.put((self.panic, ()))
+        self._push(self.keyboardBuffer, timestamp, self.keyboardEvent.onPress,
+                key)
 
     @canonize
     def onReleaseEmit(self, key):
-        """Emits signal to listWidget to update with key released.
+        """Hands a key release over to listWidget.
         
         Args:
             key (KeyCode): Key released.
         """
-        self.listWidget.keyRelease.emit(self.startTime, key)
+        timestamp = self.clock.nowNs() / 1e9
+        self.keysPressed.discard(key)
+        self._push(self.keyboardBuffer, timestamp,
+                self.keyboardEvent.onRelease, key)
+
+    def panic(self):
+        """Stops every macro and releases everything any macro is holding.
+
+        Stopping each macro also puts the hotkeys back.
+        """
+        if self.scheduler is not None:
+            self.scheduler.removeAll()
+        if self.engine is not None:
+            self.engine.panic()
+        heldInputs.releaseAll()
 
     def onClickEmit(self, x, y, button, pressed):
-        """Emits signal to listWidget to update with a mouse click.
+        """Hands a mouse click over to listWidget.
 
         Args:
             x (int): X coordinate of mouse press.
@@ -229,14 +466,11 @@ class KeyWatcher():
             button (Enum (I think?)): Left or right click.
             pressed (bool): Whether the mouse was clicked or not.
         """
-        self.listWidget.mousePress.emit(self.startTime, x, y, button, pressed)
-
-    def onWaitEmit(self):
-        """Emits signal to listWidget to update when user does nothing."""
-        self.listWidget.wait.emit(self.startTime)
+        self._push(self.mouseBuffer, self.clock.nowNs() / 1e9,
+                self.clickEvent.onClick, x, y, button, pressed)
 
     def onScrollEmit(self, x, y, dx, dy):
-        """Emite signal to listWidget to update with scroll step.
+        """Hands a scroll step over to listWidget.
 
         Args:
             x (int): Current x position of the scroll wheel.
@@ -244,44 +478,52 @@ class KeyWatcher():
             dx (int): X offset from last scroll wheel position.
             dy (int): Y offset from last scroll wheel position.
         """
-        self.listWidget.mouseScroll.emit(self.startTime, x, y, dx, dy)
-
-    def startUpdater(self):
-        """Begins the thread that updates the hold time for each step."""
-        if not self.updater.is_alive():
-            self.updater = Thread(target=self._update)
-            self.updater.start()
+        self._push(self.mouseBuffer, self.clock.nowNs() / 1e9,
+                self.scrollEvent.onScroll, x, y, dx, dy)
 
     @synchronize
+    def _heldSnapshot(self):
+        """Synchronously copies the keysDown dict's items."""
+        return list(self.keysDown.items())
+
     def _updateTime(self):
         """Updates the hold time for each step in the holdKeys dict."""
-        for key, (press, startTime, stepType) in self.keysDown.items():
-            pressTime = time.time() - startTime
+        now = self.clock.now()
+        for key, (stepIdx, startTime, stepType) in self._heldSnapshot():
+            pressTime = now - startTime
             if stepType == StepEnum.KEY:
                 if pressTime > KeyboardEvent.KEY_PRESS_DELTA:
-                    press.setText('%.2f' % (time.time() - startTime))
+                    self.listWidget.updateRecordedStep(stepIdx,
+                            holdTime=pressTime)
             # Mouse scrolls have their own means of doing this
             elif not key == StepEnum.MOUSE_SCROLL:
-                press.setText('%.2f' % (pressTime))
+                self.listWidget.updateRecordedStep(stepIdx,
+                        holdTime=pressTime)
 
-    def _update(self):
+    def _refresh(self):
         """Updates the hold time for each event in the holdKeys dict.
-        
-        This is the function that's run by the thread.
-            
+
+        This is the function that's run by the refresh timer, on the GUI
+        thread. Also displays whatever recorded steps changed, unless fast
+        recording.
         """
-        while self.recording:
-            self.startTime = time.time() - self.recordStartTime + \
-                    self.recordTotalTime
-            if StepEnum.MOUSE_SCROLL in self.keysDown:
-                self.scrollEvent.update()
-            self.onWaitEmit()
-            self._updateTime()
+        self._updateTime()
+        if not self._fastRecord:
+            self.listWidget.renderSteps()
+
+    def stopPlayback(self):
+        """Stops every macro and waits for the playback process to exit.
 
-            # sleep to save cpu cycles
-            time.sleep(.1)
+        The playback process is a daemon, so it has to be asked to release
+        what it's holding before we exit and it's killed.
+        """
+        self.panic()
+        if self.engine is not None:
+            self.engine.shutdown()
+            self.engine = None
 
     def shutdown(self):
+        self.stopPlayback()
         PostQuitMessage(0)
         # stop relavent threads?
 
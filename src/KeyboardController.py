@@ -33,17 +33,159 @@ class Input(ctypes.Structure):
 
 # Actuals Functions
 
-def pressKey(hexKeyCode):
-    extra = ctypes.c_ulong(0)
-    ii_ = Input_I()
-    ii_.ki = KeyBdInput( 0, hexKeyCode, 0x0008, 0, ctypes.pointer(extra) )
-    x = Input( ctypes.c_ulong(1), ii_ )
-    ctypes.windll.user32.SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
-
-def releaseKey(hexKeyCode):
-    extra = ctypes.c_ulong(0)
-    ii_ = Input_I()
-    ii_.ki = KeyBdInput( 0, hexKeyCode, 0x0008 | 0x0002, 0,
-            ctypes.pointer(extra) )
-    x = Input( ctypes.c_ulong(1), ii_ )
-    ctypes.windll.user32.SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_WHEEL = 0x0800
+MOUSEEVENTF_VIRTUALDESK = 0x4000
+MOUSEEVENTF_ABSOLUTE = 0x8000
+
+# Flags to move the mouse to absolute coordinates across every monitor.
+MOUSEEVENTF_MOVE_ABSOLUTE = MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE | \
+        MOUSEEVENTF_VIRTUALDESK
+
+WHEEL_DELTA = 120
+
+_SM_XVIRTUALSCREEN = 76
+_SM_YVIRTUALSCREEN = 77
+_SM_CXVIRTUALSCREEN = 78
+_SM_CYVIRTUALSCREEN = 79
+
+def virtualScreen():
+    """Returns the bounds of the virtual screen (every monitor combined).
+
+    Return: Tuple formatted as (left, top, width, height).
+    """
+    metrics = ctypes.windll.user32.GetSystemMetrics
+    return (metrics(_SM_XVIRTUALSCREEN), metrics(_SM_YVIRTUALSCREEN),
+            metrics(_SM_CXVIRTUALSCREEN), metrics(_SM_CYVIRTUALSCREEN))
+
+def toAbsolute(x, y, screen):
+    """Converts pixel coordinates into SendInput's absolute coordinates.
+
+    SendInput's absolute coordinates range from 0 to 65535 across the
+    virtual screen.
+
+    Args:
+        x (float): X coordinate in pixels.
+        y (float): Y coordinate in pixels.
+        screen (Tuple): Bounds of the virtual screen returned by
+                        virtualScreen().
+
+    Return: Tuple containing the absolute x and y coordinates.
+    """
+    left, top, width, height = screen
+    return (round((x - left) * 65535 / max(width - 1, 1)),
+            round((y - top) * 65535 / max(height - 1, 1)))
+
+class InputBatch():
+    """Preallocated array of inputs that are sent with one SendInput call.
+
+    Inputs added to the batch aren't sent until the batch is flushed. This
+    way, all the inputs due at the same time (e.g. every key of a chord) reach
+    the target application together and only cost a single system call.
+    Keys and the mouse go through the same batch so they stay in order.
+
+    Attributes:
+        size (int): Number of inputs the batch can hold before it has to be
+                    flushed.
+        inputs (Array): Preallocated array of Input structs that are reused
+                        every flush.
+        count (int): Number of inputs currently in the batch.
+    """
+
+    DEFAULT_SIZE = 64
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """Preallocates the Input array.
+
+        Args:
+            size (int): Number of inputs the batch can hold before it has to
+                        be flushed.
+        """
+        self.size = size
+        self.inputs = (Input * size)()
+        self.count = 0
+
+        # Every input can share the same extra info.
+        self._extra = ctypes.c_ulong(0)
+        self._extraPtr = ctypes.pointer(self._extra)
+
+    def _next(self, inputType):
+        """Returns the next unused Input struct in the batch.
+
+        Args:
+            inputType (int): Whether the input is a mouse or keyboard input.
+        """
+        if self.count == self.size:
+            self.flush()
+        toSet = self.inputs[self.count]
+        toSet.type = inputType
+        self.count += 1
+        return toSet
+
+    def addKey(self, scanCode, keyUp=False, extended=False):
+        """Adds a key press or release to the batch.
+
+        Args:
+            scanCode (int): Scan code of the key.
+            keyUp (bool): Whether to release the key instead of pressing it.
+            extended (bool): Whether the key needs the extended key flag
+                             (e.g. arrow keys). See KeyTable.
+        """
+        flags = KEYEVENTF_SCANCODE
+        if keyUp:
+            flags |= KEYEVENTF_KEYUP
+        if extended:
+            flags |= KEYEVENTF_EXTENDEDKEY
+        keyInput = self._next(INPUT_KEYBOARD).ii.ki
+        keyInput.wVk = 0
+        keyInput.wScan = scanCode
+        keyInput.dwFlags = flags
+        keyInput.time = 0
+        keyInput.dwExtraInfo = self._extraPtr
+
+    def addMouse(self, dx, dy, flags, mouseData=0):
+        """Adds a mouse input to the batch.
+
+        Args:
+            dx (int): Absolute x coordinate to move to if flags contains
+                      MOUSEEVENTF_MOVE_ABSOLUTE.
+            dy (int): Absolute y coordinate to move to if flags contains
+                      MOUSEEVENTF_MOVE_ABSOLUTE.
+            flags (int): MOUSEEVENTF flags describing the input.
+            mouseData (int): Wheel movement if scrolling.
+        """
+        mouseInput = self._next(INPUT_MOUSE).ii.mi
+        mouseInput.dx = dx
+        mouseInput.dy = dy
+        # mouseData is unsigned, so negative wheel movement has to wrap.
+        mouseInput.mouseData = mouseData & 0xFFFFFFFF
+        mouseInput.dwFlags = flags
+        mouseInput.time = 0
+        mouseInput.dwExtraInfo = self._extraPtr
+
+    def addScroll(self, ticks):
+        """Adds vertical scrolling to the batch.
+
+        Args:
+            ticks (int): Number of ticks to scroll. Positive scrolls up.
+        """
+        self.addMouse(0, 0, MOUSEEVENTF_WHEEL, ticks * WHEEL_DELTA)
+
+    def flush(self):
+        """Sends every input in the batch and empties it."""
+        if self.count:
+            ctypes.windll.user32.SendInput(self.count, self.inputs,
+                    ctypes.sizeof(Input))
+            self.count = 0
+
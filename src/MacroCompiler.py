@@ -0,0 +1,440 @@
+"""File containing the logic to compile a macro into a playback timeline.
+
+Steps are stored as (stepType, data, holdTime, stepStart) tuples which are
+convenient for displaying and editing, but not for playing back. Before a
+macro runs, its steps are compiled once into a flat list of events sorted by
+when they need to be performed. Each event is a tuple formatted as follows:
+
+    (deadline, event_type, payload, step_type)
+
+deadline (float): Time in seconds since the start of the macro to perform
+                  the event.
+event_type (EventEnum): What to do when the deadline is reached.
+payload (Object): Data needed to perform the event. This is resolved at
+                  compile time (keys are translated with the input backend's
+                  key table) so nothing needs to be looked up during
+                  playback. For each event type we have the following
+                  payload:
+
+                  KEY_DOWN /
+                  KEY_UP:       (KeyRecord) The key to press or release.
+                  MOUSE_DOWN /
+                  MOUSE_UP:     (Tuple)     (dx, dy, flags) where flags are
+                                            the MOUSEEVENTF flags to send and
+                                            dx and dy are the absolute
+                                            coordinates to move the mouse to
+                                            if the flags contain a move.
+                  SCROLL:       (int)       Number of ticks to scroll
+                                            vertically.
+                  MOUSE_MOVE:   (Tuple)     (dx, dy) absolute coordinates
+                                            to move the mouse to.
+step_type (StepEnum): Type of the step the event came from.
+"""
+
+from KeyboardController import MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP, \
+        MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP, MOUSEEVENTF_MOVE_ABSOLUTE, \
+        toAbsolute
+from StepTypes import StepEnum, EventEnum
+from operator import itemgetter
+
+# Mapping of step type -> flags to press and release its mouse button.
+_BUTTONS = {
+    StepEnum.MOUSE_LEFT: (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+    StepEnum.MOUSE_RIGHT: (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+    StepEnum.MOUSE_LEFT_DRAG: (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+    StepEnum.MOUSE_RIGHT_DRAG: (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+}
+
+# Mapping of the flag that presses a mouse button -> the flag that releases it.
+_RELEASE_FLAGS = {
+    MOUSEEVENTF_LEFTDOWN: MOUSEEVENTF_LEFTUP,
+    MOUSEEVENTF_RIGHTDOWN: MOUSEEVENTF_RIGHTUP,
+}
+
+def heldInput(eventType, payload):
+    """Returns which input an event presses or releases.
+
+    Used to keep track of what a macro is holding down, so it can be
+    released if the macro stops early.
+
+    Args:
+        eventType (EventEnum): Type of the event.
+        payload (Object): Payload of the event. See the file docstring.
+
+    Return: Tuple formatted as (input, release) where input identifies the
+            key or mouse button, and release is the (event_type, payload)
+            that releases it. None if the event doesn't press or release
+            anything (e.g. scrolls).
+    """
+    if eventType == EventEnum.KEY_DOWN or eventType == EventEnum.KEY_UP:
+        return payload, (EventEnum.KEY_UP, payload)
+    if eventType == EventEnum.MOUSE_DOWN or eventType == EventEnum.MOUSE_UP:
+        flags = payload[2]
+        for down, up in _RELEASE_FLAGS.items():
+            if flags & (down | up):
+                return up, (EventEnum.MOUSE_UP, (0, 0, up))
+    return None
+
+def latencyPath(eventType, payload):
+    """Returns which output path an event is sent through.
+
+    Each path takes a different amount of time to get an input accepted by
+    the OS, so each gets its own entry in the latency table. See
+    Calibration.calibrate.
+
+    Args:
+        eventType (EventEnum): Type of the event.
+        payload (Object): Payload of the event. See the file docstring.
+
+    Return: One of 'key', 'extendedKey', 'mouse' or 'scroll'.
+    """
+    if eventType == EventEnum.KEY_DOWN or eventType == EventEnum.KEY_UP:
+        return 'extendedKey' if payload.extended else 'key'
+    if eventType == EventEnum.SCROLL:
+        return 'scroll'
+    return 'mouse'
+
+# Placeholder event types for pressing and releasing shift. Shift can be held
+# by a recorded shift step and by the shift wrapped around characters at the
+# same time, so these are turned into real events by _mergeShift.
+_SHIFT_DOWN = 'shiftDown'
+_SHIFT_UP = 'shiftUp'
+
+def _compileKey(timeline, table, data, holdTime, stepStart, repeatDelay,
+        repeatRate):
+    """Appends the events for a key step to the timeline.
+
+    The key is pressed once and released once. If auto-repeat is enabled,
+    extra presses are added while the key is held, like a physical keyboard
+    would. Characters that need shift to be typed are wrapped in a shift
+    press. Every key, extended or not, is sent by its scan code.
+
+    Shift itself is pressed and released with placeholder events. See
+    _mergeShift.
+
+    Args:
+        timeline (list): List of events to append to.
+        table (KeyTable): Table to translate the key with. See
+                          InputBackend.keyTable.
+        data (str): The key to press.
+        holdTime (float): Time to hold the key for.
+        stepStart (float): Time since the start of the macro to press the key.
+        repeatDelay (float): Time the key needs to be held before it starts
+                             repeating. 0 to disable auto-repeat.
+        repeatRate (float): Number of repeats per second.
+    """
+    record = table.lookup(data)
+    if record is None:
+        print(f'Can\'t type {data} with the current keyboard layout')
+        return
+    down, up = EventEnum.KEY_DOWN, EventEnum.KEY_UP
+    shift = table.lookup('shift') if record.needsShift else None
+    press, release = (_SHIFT_DOWN, _SHIFT_UP) if data == 'shift' \
+            else (down, up)
+
+    stepEnd = stepStart + holdTime
+    key = StepEnum.KEY
+    if shift:
+        timeline.append((stepStart, _SHIFT_DOWN, shift, key))
+    timeline.append((stepStart, press, record, key))
+    if repeatDelay > 0 and repeatRate > 0:
+        repeatTime = stepStart + repeatDelay
+        repeat = 0
+        while repeatTime + repeat / repeatRate < stepEnd:
+            timeline.append((repeatTime + repeat / repeatRate, down, record,
+                    key))
+            repeat += 1
+    timeline.append((stepEnd, release, record, key))
+    if shift:
+        timeline.append((stepEnd, _SHIFT_UP, shift, key))
+
+def _mergeShift(timeline):
+    """Turns the placeholder shift events of a sorted timeline into events.
+
+    Shift is only pressed when nothing is holding it yet, and only released
+    once nothing is holding it anymore, so a character wrapped in shift
+    doesn't release a shift step that's still held.
+
+    Args:
+        timeline (list): Timeline sorted by deadline.
+
+    Return: The timeline with the placeholders replaced.
+    """
+    merged = []
+    holders = 0
+    for event in timeline:
+        eventType = event[1]
+        if eventType == _SHIFT_DOWN:
+            holders += 1
+            if holders > 1:
+                continue
+            event = (event[0], EventEnum.KEY_DOWN, event[2], event[3])
+        elif eventType == _SHIFT_UP:
+            holders -= 1
+            if holders > 0:
+                continue
+            event = (event[0], EventEnum.KEY_UP, event[2], event[3])
+        merged.append(event)
+    return merged
+
+def _compileClick(timeline, screen, stepType, data, holdTime, stepStart,
+        dragRate):
+    """Appends the events for a mouse click or drag step to the timeline.
+
+    The mouse is moved and pressed with a single input. Drags also move the
+    mouse to where they end when the button is released. If dragRate is set,
+    drags move the mouse along a straight line between the two at a fixed
+    rate while the button is held, so the cursor doesn't jump to the end.
+
+    Args:
+        timeline (list): List of events to append to.
+        screen (Tuple): Bounds of the virtual screen. See KeyboardController.
+        stepType (StepEnum): Type of click.
+        data (Tuple): Coordinates of the click, or the start and end
+                      coordinates if the step is a drag.
+        holdTime (float): Time to hold the button for.
+        stepStart (float): Time since the start of the macro to press the
+                           button.
+        dragRate (float): Number of times per second to move the mouse while
+                          dragging. 0 to only move it when the button is
+                          released.
+    """
+    downFlags, upFlags = _BUTTONS[stepType]
+    if stepType == StepEnum.MOUSE_LEFT or stepType == StepEnum.MOUSE_RIGHT:
+        start, end = data, None
+        release = (0, 0, upFlags)
+    else:
+        start, end = data
+        release = (*toAbsolute(*end, screen),
+                upFlags | MOUSEEVENTF_MOVE_ABSOLUTE)
+    press = (*toAbsolute(*start, screen),
+            downFlags | MOUSEEVENTF_MOVE_ABSOLUTE)
+    timeline.append((stepStart, EventEnum.MOUSE_DOWN, press, stepType))
+
+    if end and dragRate > 0 and holdTime > 0:
+        (startX, startY), (endX, endY) = start, end
+        sample = 1
+        while sample / dragRate < holdTime:
+            fraction = sample / dragRate / holdTime
+            point = (startX + (endX - startX) * fraction,
+                    startY + (endY - startY) * fraction)
+            timeline.append((stepStart + sample / dragRate,
+                    EventEnum.MOUSE_MOVE, toAbsolute(*point, screen),
+                    stepType))
+            sample += 1
+
+    timeline.append((stepStart + holdTime, EventEnum.MOUSE_UP, release,
+            stepType))
+
+def _compileScroll(timeline, data, holdTime, stepStart):
+    """Appends the events for a scroll step to the timeline.
+
+    The scroll is split into single ticks spread evenly across the time
+    the step is held for.
+
+    Args:
+        timeline (list): List of events to append to.
+        data (float): Y direction scroll offset.
+        holdTime (float): Time spent scrolling.
+        stepStart (float): Time since the start of the macro to start
+                           scrolling.
+    """
+    numTicks = abs(int(round(data)))
+    if numTicks == 0:
+        return
+    direction = 1 if data > 0 else -1
+    timePerTick = holdTime / numTicks
+    for tick in range(numTicks):
+        timeline.append((stepStart + tick * timePerTick, EventEnum.SCROLL,
+                direction, StepEnum.MOUSE_SCROLL))
+
+# Options used when a macro doesn't set its own. See retimeSteps.
+DEFAULT_OPTIONS = {
+    'speed': 1,
+    'maxIdleGap': 0,
+    'minSpacing': 0,
+    'latenessPolicy': 'catchUp',
+    'lateThreshold': .05,
+}
+
+# What to do when playback falls behind. See MacroRunner.
+LATENESS_POLICIES = ('catchUp', 'shift', 'skip')
+
+def _isNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Mapping of option name -> function returning whether a value is valid.
+_OPTION_CHECKS = {
+    'speed': lambda value: _isNumber(value) and value > 0,
+    'maxIdleGap': lambda value: _isNumber(value) and value >= 0,
+    'minSpacing': lambda value: _isNumber(value) and value >= 0,
+    'latenessPolicy': lambda value: value in LATENESS_POLICIES,
+    'lateThreshold': lambda value: _isNumber(value) and value >= 0,
+}
+
+def validateOptions(options):
+    """Returns a macro's options without the ones that aren't valid.
+
+    Options are dropped rather than fixed, so they fall back to
+    DEFAULT_OPTIONS, and each one dropped is printed.
+
+    Args:
+        options (dict): Mapping of option name to value. See retimeSteps.
+
+    Return: Mapping of every valid option name to its value.
+    """
+    valid = {}
+    for name, value in (options or {}).items():
+        check = _OPTION_CHECKS.get(name)
+        if check and check(value):
+            valid[name] = value
+        else:
+            print(f'Ignoring invalid macro option {name}: {value!r}')
+    return valid
+
+def retimeSteps(steps, totalTime, options=None):
+    """Rewrites the times of a macro's steps according to its options.
+
+    Done once before a macro is compiled, so none of the options cost
+    anything during playback. Time where no step other than an active wait
+    is held counts as idle. Every idle gap longer than maxIdleGap is
+    squeezed down to maxIdleGap, then every time is divided by speed. Last,
+    instants where events happen are pushed apart so they're at least
+    minSpacing apart, delaying everything after them.
+
+    Args:
+        steps (list): List of tuples containing the data of each step. More
+                      details in KeyListWidgetStep.
+        totalTime (float): Total time to run the macro.
+        options (dict): Mapping of option name to value. Missing options
+                        are taken from DEFAULT_OPTIONS:
+
+                        speed (float): Multiplier for how fast to play the
+                                       macro back. Must be positive.
+                        maxIdleGap (float): Longest an idle gap can be in
+                                            seconds. 0 to leave gaps alone.
+                        minSpacing (float): Least time in seconds between
+                                            two instants with events. 0 to
+                                            disable.
+
+                        latenessPolicy and lateThreshold are only used
+                        during playback. See MacroRunner.
+
+    Return: Tuple formatted as (steps, totalTime) with the rewritten times.
+            The passed in steps are returned as is if no option changes them.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    speed = options['speed']
+    maxIdleGap = options['maxIdleGap']
+    minSpacing = options['minSpacing']
+    if speed == 1 and maxIdleGap <= 0 and minSpacing <= 0:
+        return steps, totalTime
+
+    busy = sorted((start, start + hold) for stepType, _, hold, start in steps
+            if stepType != StepEnum.ACTIVE_WAIT)
+    eventTimes = {time for interval in busy for time in interval}
+    times = {time for _, _, hold, start in steps
+            for time in (start, start + hold)}
+    times.add(totalTime)
+
+    # Find the idle gaps, including the ones before the first step and after
+    # the last one.
+    gaps = []
+    covered = 0
+    for start, end in busy:
+        if start > covered:
+            gaps.append((covered, start))
+        covered = max(covered, end)
+    last = max(times)
+    if last > covered:
+        gaps.append((covered, last))
+    if maxIdleGap <= 0:
+        gaps = []
+
+    newTimes = {}
+    gapIdx = 0
+    removed = 0
+    shift = 0
+    prevEvent = None
+    for time in sorted(times):
+        while gapIdx < len(gaps) and gaps[gapIdx][1] <= time:
+            gapStart, gapEnd = gaps[gapIdx]
+            removed += max(0, gapEnd - gapStart - maxIdleGap)
+            gapIdx += 1
+        newTime = time - removed
+
+        # Times inside a gap (e.g. the end of an active wait) are squeezed
+        # along with it.
+        if gapIdx < len(gaps) and gaps[gapIdx][0] < time:
+            gapStart, gapEnd = gaps[gapIdx]
+            length = gapEnd - gapStart
+            if length > maxIdleGap:
+                newTime = gapStart - removed + \
+                        (time - gapStart) * maxIdleGap / length
+
+        newTime = newTime / speed + shift
+        if time in eventTimes:
+            if prevEvent is not None and newTime < prevEvent + minSpacing:
+                shift += prevEvent + minSpacing - newTime
+                newTime = prevEvent + minSpacing
+            prevEvent = newTime
+        newTimes[time] = newTime
+
+    retimed = []
+    for stepType, data, hold, start in steps:
+        newStart = newTimes[start]
+        retimed.append((stepType, data, newTimes[start + hold] - newStart,
+                newStart))
+    return retimed, newTimes[totalTime]
+
+def compileMacro(steps, backend, repeatDelay=0, repeatRate=0, dragRate=0,
+        latency=None):
+    """Compiles a macro's steps into a timeline of events.
+
+    Active waits don't do anything when played back, so they don't produce
+    any events. If a latency table is passed in, each event's deadline is
+    moved earlier by how long its output path takes to get an input
+    accepted, so the input lands when it was recorded. Deadlines are never
+    moved before the start of the macro.
+
+    Args:
+        steps (list): List of tuples containing the data of each step. More
+                      details in KeyListWidgetStep.
+        backend (InputBackend): Backend the macro will be played back with.
+                                Keys and coordinates are translated with it.
+        repeatDelay (float): Time a key needs to be held before it starts
+                             auto-repeating. 0 to disable auto-repeat.
+        repeatRate (float): Number of auto-repeats per second.
+        dragRate (float): Number of times per second to move the mouse while
+                          dragging. 0 to only move it at the start and end.
+        latency (dict): Mapping of output path -> seconds it takes to send
+                        an input through it. See latencyPath. Missing paths
+                        aren't compensated for.
+
+    Return: List of event tuples sorted by deadline. Events with the same
+            deadline are kept in the order their steps were in.
+    """
+    timeline = []
+    table = backend.keyTable()
+    screen = backend.virtualScreen()
+    for stepType, data, holdTime, stepStart in steps:
+        if stepType == StepEnum.KEY:
+            _compileKey(timeline, table, data, holdTime, stepStart,
+                    repeatDelay, repeatRate)
+        elif stepType == StepEnum.MOUSE_SCROLL:
+            _compileScroll(timeline, data, holdTime, stepStart)
+        elif stepType in _BUTTONS:
+            _compileClick(timeline, screen, stepType, data, holdTime,
+                    stepStart, dragRate)
+
+    # sort is stable, so events sharing a deadline stay in the order they
+    # were appended (e.g. a key tap is still pressed before it's released).
+    timeline.sort(key=itemgetter(0))
+    timeline = _mergeShift(timeline)
+
+    if latency and any(latency.values()):
+        timeline = [(max(0, deadline - latency.get(latencyPath(eventType,
+                payload), 0)), eventType, payload, stepType)
+                for deadline, eventType, payload, stepType in timeline]
+        timeline.sort(key=itemgetter(0))
+    return timeline
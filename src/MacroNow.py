@@ -181,6 +181,7 @@ if __name__ == "__main__":
     hotkeyRecorder = Hotkeys(watcher)
     AppConfig.setUpClass(hotkeyRecorder, ui)
     AppConfig.readConfig()
+    watcher.startPlayback()
 
     ui.recordShortcut.connect(
             lambda: ui.onRecordShortcut(hotkeyRecorder))
@@ -199,6 +200,9 @@ if __name__ == "__main__":
     ui.saveButton.clicked.connect(lambda: util.write(OUT_FILE, ui.listWidget))
     ui.configButton.clicked.connect(lambda: ui.configEvent())
 
+    # Don't leave anything pressed if we quit while a macro is running.
+    app.aboutToQuit.connect(watcher.stopPlayback)
+
     # Disable buttons that shouldn't be pressed when displaying macros.
     ui.backButton.setDisabled(True)
     ui.recordButton.setDisabled(True)
@@ -1,195 +1,631 @@
-"""File containing the class the run a macro.
-
-This file needs major refactoring.
-"""
+"""File containing the class the run a macro."""
+
+from MacroCompiler import compileMacro, retimeSteps, heldInput, \
+        DEFAULT_OPTIONS, LATENESS_POLICIES
+from Scheduler import DeadlineScheduler, PlaybackScheduler
+from Clock import defaultClock
+from Telemetry import PlaybackTelemetry
+from HeldInputs import heldInputs
+from KeyboardController import MOUSEEVENTF_MOVE, MOUSEEVENTF_MOVE_ABSOLUTE
+from StepTypes import EventEnum
+from threading import Event
+from collections import deque
+from bisect import bisect_left
+
+class MacroRunner():
+    """Plays back a macro.
+
+    The macro's steps are compiled into a timeline once when the runner is
+    created (see MacroCompiler). The runner is then a stream of events for a
+    PlaybackScheduler: each loop just walks a cursor through the timeline,
+    and whenever the scheduler reaches the next event's deadline the runner
+    performs every event whose deadline has passed. Held keys stay down on
+    their own, so there's nothing to do in between.
+
+    Loop N starts at exactly N * period after the first loop started, so
+    looping for hours doesn't drift.
+
+    The runner is also the handle to control playback with. stop(), pause()
+    and resume() just queue a request and ask the scheduler to perform the
+    runner right away, so they take effect within one scheduler slot.
+    Requests are handled in the order they were made, except stop, which
+    wins over everything. Whatever the macro is holding down is released
+    when it's stopped or paused, and pressed again when it's resumed, with
+    every remaining deadline pushed back by however long it was paused.
+    Mouse buttons are pressed again wherever the macro has moved the mouse
+    to (e.g. part way through a drag). Held inputs are also recorded in the
+    heldInputs ledger, and released if the macro is removed from the
+    scheduler or raises an error.
+
+    seek() moves playback to any time in the macro, pressing whatever the
+    macro would be holding at that time. To keep this fast for huge macros,
+    a snapshot of what's held is taken every _CHECKPOINT_INTERVAL events the
+    first time the macro is seeked, so only the events since the nearest
+    snapshot need to be replayed.
+
+    The macro's options (see MacroCompiler.retimeSteps) are applied to its
+    steps before they're compiled, so they don't slow down playback. Two
+    more options decide what happens when the machine stalls and events are
+    more than lateThreshold seconds late. With the latenessPolicy set to:
+
+        catchUp: Every overdue event is performed right away.
+        shift: Every remaining deadline is pushed back by how late the
+               first overdue event is, as if the macro was paused for the
+               stall.
+        skip: Overdue events are dropped. Releases are only dropped if
+              what they release was never pressed, so nothing is left held
+              down.
+
+    latenessCounts counts how often the policy kicked in.
+
+    Every event is sent through an InputBackend, so the runner doesn't depend
+    on Windows itself. Passing in a VirtualClock (and a RecordingBackend)
+    plays the macro back instantly, which is useful for testing and
+    benchmarking.
+
+    Attributes:
+        options (dict): Playback options of the macro. See
+                        MacroCompiler.retimeSteps.
+        timeline (list): Compiled events of the macro.
+        period (float): Time between the start of each loop.
+        loopLateness (list): The latest any event fired in each loop that
+                             has been run, in seconds.
+        telemetry (PlaybackTelemetry): Records when every event was
+                                       scheduled and actually sent.
+        backend (InputBackend): Where events are sent. Events due in the
+                                same slot are flushed together.
+        scheduler (PlaybackScheduler): Scheduler the macro is played back
+                                       by. Shared by every macro when
+                                       running in the GUI.
+        loopInf (bool): Whether or not to keep looping until the hotkey is
+                        pressed again.
+        stopLatency (float): Seconds between stop() being called and the
+                             macro's held inputs being released. None until
+                             the macro is stopped.
+        latenessCounts (dict): Mapping of lateness policy -> number of
+                               times it kicked in. For skip, this is the
+                               number of events dropped, otherwise it's the
+                               number of times events were overdue.
+        recorder (Hotkeys): Hotkey recorder used throughout the program. None
+                            when playing back without the GUI (e.g. when
+                            benchmarking), in which case hotkeys are left
+                            alone.
+    """
+
+    # Shortest a loop can be, so empty macros don't loop as fast as possible.
+    _DELTA = .1
 
-import pynput._util.win32_vks as VK
-from StepConstants import StepEnum, keyConst, keyToVK, isVKPress
-from StepEvents import KeyboardEvent
-from KeyboardController import pressKey, releaseKey
-from pynput.keyboard import KeyCode
-from win32api import MapVirtualKey, VkKeyScan
-from pynput.mouse import Button
-from queue import PriorityQueue
-from threading import Thread
-import time
+    # Requests made by the handle methods, handled on the scheduler's thread.
+    _STOP = 0
+    _PAUSE = 1
+    _RESUME = 2
+    _SEEK = 3
 
-class MacroRunner(Thread):
+    # Number of events between snapshots of what's held. See seek().
+    _CHECKPOINT_INTERVAL = 256
 
-    _DELTA = .1
+    LATENESS_POLICIES = LATENESS_POLICIES
 
     # TODO this is stupid, refactor this
-    def __init__(self, steps, totalTime, loopNum, mouse, keyboard, keys,
-            recorder):
-        args = (steps, totalTime, loopNum, mouse, keyboard, keys, recorder)
-        super().__init__(target=self.runMacro, args=args)
+    def __init__(self, steps, totalTime, loopNum, keys, recorder, backend,
+            spinThreshold=DeadlineScheduler.DEFAULT_SPIN_THRESHOLD,
+            repeatDelay=0, repeatRate=0, clock=defaultClock, options=None,
+            scheduler=None, dragRate=0, onFinish=None, latency=None):
+        """Compiles the macro.
+
+        Args:
+            steps (list): List of tuples containing the data of each step.
+                          More details in KeyListWidgetStep.
+            totalTime (float): Time it takes to run the macro.
+            loopNum (int): Number of times to run the macro. -1 to run
+                           until the hotkey is pressed again.
+            keys (set): Set of KeyCodes which make up the hotkey that maps
+                        to the macro.
+            recorder (Hotkeys): See class docstring.
+            backend (InputBackend): See class docstring.
+            spinThreshold (float): See DeadlineScheduler. Only used if no
+                                   scheduler is passed in.
+            repeatDelay (float): See MacroCompiler.compileMacro.
+            repeatRate (float): See MacroCompiler.compileMacro.
+            clock (RealClock | VirtualClock): Clock to play back with. Only
+                                              used if no scheduler is passed
+                                              in.
+            options (dict): See class docstring.
+            scheduler (PlaybackScheduler): Scheduler to play back with. If
+                                           None, the macro gets its own.
+            dragRate (float): See MacroCompiler.compileMacro.
+            onFinish (func): Called with the runner once it's done playing
+                             back.
+            latency (dict): See MacroCompiler.compileMacro.
+        """
+        self.steps = steps
+        self.totalTime = totalTime
+        self.loopNum = loopNum
+        self.keys = keys
+        self.recorder = recorder
+        self.options = options
+        self.onFinish = onFinish
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        if options['latenessPolicy'] not in MacroRunner.LATENESS_POLICIES:
+            raise ValueError('Unknown lateness policy '
+                    f'{options["latenessPolicy"]}')
+        self._policy = options['latenessPolicy']
+        self._lateThreshold = options['lateThreshold']
+        self.latenessCounts = dict.fromkeys(MacroRunner.LATENESS_POLICIES, 0)
+        retimed, retimedTotal = retimeSteps(steps, totalTime, options)
+        self.timeline = compileMacro(retimed, backend, repeatDelay,
+                repeatRate, dragRate, latency)
+        lastDeadline = self.timeline[-1][0] if self.timeline else 0
+        self.period = max(retimedTotal, lastDeadline, MacroRunner._DELTA)
+        self.loopLateness = []
+        self.telemetry = PlaybackTelemetry()
+        self.backend = backend
+        self.scheduler = scheduler if scheduler is not None \
+                else PlaybackScheduler(spinThreshold, clock)
         self.loopInf = True
-
-    def _finishLoop(self):
-        self.loopInf = False
-
-    def runMacro(self, steps, totalTime, loopNum, mouse, keyboard, keys,
-            recorder):
+        self.stopLatency = None
+        self._dispatch = {
+            EventEnum.KEY_DOWN: backend.keyDown,
+            EventEnum.KEY_UP: backend.keyUp,
+            EventEnum.MOUSE_DOWN: self._mouseButton,
+            EventEnum.MOUSE_UP: self._mouseButton,
+            EventEnum.SCROLL: backend.scroll,
+            EventEnum.MOUSE_MOVE: self._mouseMove,
+        }
+
+        # For each event, None if it doesn't press or release anything, or
+        # (input, pressed, press, release) where press and release are the
+        # (event_type, payload) to press and release the input with.
+        self._holds = []
+        for _, eventType, payload, _ in self.timeline:
+            held = heldInput(eventType, payload)
+            if held:
+                pressed = eventType == EventEnum.KEY_DOWN or \
+                        eventType == EventEnum.MOUSE_DOWN
+                held = (held[0], pressed, (eventType, payload), held[1])
+            self._holds.append(held)
+
+        # Playback state, advanced by the scheduler.
+        self._resetHotkey = False
+        self._epoch = 0
+        self._loopIdx = 0
+        self._loopStart = 0
+        self._cursor = 0
+        self._maxLate = 0
+        self._atBoundary = False
+        self._slot = (0, 0)
+        self._skipped = set()
+        self._started = False
+        self._finished = Event()
+        self._held = {}
+
+        # Requests are only touched while holding the scheduler's condition,
+        # since they're made from other threads.
+        self._requests = deque()
+        self._requestTime = 0
+        self._stopRequested = False
+        self._stopTime = 0
+        self._paused = False
+        self._pauseTime = 0
+        self._stopped = False
+        self._deadlines = None
+        self._checkpoints = None
+
+    def _mouseButton(self, payload):
+        self.backend.mouseButton(*payload)
+
+    def _mouseMove(self, payload):
+        self.backend.mouseMove(*payload)
+
+    def getLoopLateness(self):
+        return self.loopLateness
+
+    def getTelemetry(self):
+        return self.telemetry
+
+    def getLatenessCounts(self):
+        return self.latenessCounts
+
+    def start(self):
+        """Starts playing back the macro with the scheduler."""
+        recorder = self.recorder
 
         # If -1, stop only when user re-presses hotkey
-        resetHotkey = False
-
-        recorder.backupHotkeys()
-        if loopNum == -1:
-            recorder.setMacroToggle(keys, self._finishLoop)
-            resetHotkey = True
-        else:
+        if recorder:
+            recorder.backupHotkeys()
+        if self.loopNum == -1 and recorder:
+            recorder.setMacroToggle(self.keys, self.stop)
+            self._resetHotkey = True
+        elif self.loopNum != -1:
             self.loopInf = False
 
-        loopTrack = loopNum
-
-        while self.loopInf or loopTrack > 0:
-            loopTrack -= 1
-            runStart = time.time()
-
-            keySet = set()
-            currTime = time.time() - runStart
-            pq = PriorityQueue()
-            nextStep = 0
-            scrolling = False
-            ticksPerScroll = 0
-            scrollStartTime = 0
-            currScrollTick = 0
-            scrollDir = 0
-
-            while currTime < totalTime + MacroRunner._DELTA:
-
-
-                # more steps to perform
-                if nextStep < len(steps):
-                    step = steps[nextStep]
-                    stepType, data, holdTime, stepStart = step
-                    # check if ready to start next step
-                    if stepStart <= currTime:
-
-                        isKeyTap = stepType == StepEnum.KEY and holdTime == 0
-                        nextStep += 1
-                        if not isKeyTap:
-                            pq.put((holdTime, stepType, data, stepStart))
-
-                        # perform step.
-                        if stepType == StepEnum.MOUSE_LEFT:
-                            mouse.position = data
-                            mouse.press(Button.left)
-                                
-                        elif stepType == StepEnum.MOUSE_RIGHT:
-                            mouse.position = data
-                            mouse.press(Button.right)
-
-                        elif stepType == StepEnum.MOUSE_SCROLL:
-                            ticksPerScroll = abs(holdTime / data) if data != 0 \
-                                    else 0
-                            scrolling = True
-                            scrollStartTime = time.time()
-                            scrollDir = 1 if data > 0 else -1
-                            mouse.scroll(0, scrollDir)
-                            currScrollTick = 1
-
-                        elif stepType == StepEnum.MOUSE_LEFT_DRAG:
-                            x, y = data[0]
-                            mouse.position = (int(x), int(y))
-                            mouse.press(Button.left)
-                            print('pressed')
-
-                        elif stepType == StepEnum.MOUSE_RIGHT_DRAG:
-                            x, y = data[0]
-                            mouse.position = (int(x), int(y))
-                            mouse.press(Button.right)
-
-                        elif stepType == StepEnum.KEY:
-                            key = VkKeyScan(data) if len(data) == 1 \
-                                    else keyConst(data)
-                            scanKey = MapVirtualKey(keyToVK(key), 0)
-                            if isVKPress(key):
-                                keyboard.press(key)
-                            elif isKeyTap:
-                                pressKey(scanKey)
-                                releaseKey(scanKey)
-                            else:
-                                keySet.add(scanKey)
-                                pressKey(scanKey)
-                                releaseKey(scanKey)
-
-                # top denotes the step with the highest priority
-                topHoldTime, topStepType, topData, topStart = \
-                        pq.queue[0] if len(pq.queue) > 0 else (0, None, None, 0)
-
-                currScrollTime = time.time() - scrollStartTime
-                currTickThreshold = ticksPerScroll * currScrollTick
-
-                # if scrolling performed and current amount of time spent
-                # scrolling exceeds the current threshold to scroll again
-                if scrolling and currScrollTime > currTickThreshold:
-
-                    # If currScrollTime > ticksPerMove * (currMoveTick + 1),
-                    # then we won't reach the end point by the end time (this
-                    # could occur because we've slept for too long). So we
-                    # perform the following calculation (same idea for move)
-                    scrollDiff = currScrollTime - currTickThreshold
-                    numScroll = (scrollDiff) // ticksPerScroll
-
-                    yScroll = scrollDir * numScroll
-                    mouse.scroll(0, yScroll)
-                    currScrollTick += numScroll
-
-                # if the time when the step was first performed plus the time 
-                # the step was held for is less than the amount of time since
-                # the macro started
-                if topStepType != None and topStart + topHoldTime < currTime:
-                    # step is done so remove from queue
-                    pq.get(block=False)
-                    # unperform step
-                    if topStepType == StepEnum.MOUSE_LEFT:
-                        mouse.release(Button.left)
-                    elif topStepType == StepEnum.MOUSE_RIGHT:
-                        mouse.release(Button.right)
-
-                    elif topStepType == StepEnum.MOUSE_SCROLL:
-                        # only need to set scrolling to False because
-                        # next time scrolling is set to True, all other
-                        # relavent variables will be set to new values
-                        scrolling = False
-
-                    elif topStepType == StepEnum.MOUSE_LEFT_DRAG:
-                        start, end = topData
-                        x, y = end
-                        mouse.position = (int(x), int(y))
-                        mouse.release(Button.left)
-                    elif topStepType == StepEnum.MOUSE_RIGHT_DRAG:
-                        start, end = topData
-                        x, y = end
-                        mouse.position = (int(x), int(y))
-                        mouse.release(Button.right)
-
-                    elif topStepType == StepEnum.KEY:
-                        key = VkKeyScan(topData) if len(topData) == 1 \
-                                else keyConst(topData)
-                        if isVKPress(key):
-                            keyboard.release(key)
-                        else:
-                            key = MapVirtualKey(keyToVK(key), 0)
-                            try:
-                                keySet.remove(key)
-                            except KeyError:
-                                print(key)
-
-                for key in keySet:
-                    pressKey(key)
-                    releaseKey(key)
-
-                currTime = time.time() - runStart
-
-                # sleep for cpu
-                time.sleep(.02)
-
-        if resetHotkey:
-            idx = recorder.findHotkey(keys, recording=False)
-            recorder.setHotkey(idx, keys, steps, totalTime, loopNum,
-                    recording=False)
-        recorder.reloadHotkeys()
-
+        # Every loop's deadlines are measured from the same epoch, so
+        # lateness in one loop doesn't push back the loops after it.
+        self._epoch = self.scheduler.now()
+        self._beginLoop()
+        with self.scheduler.condition:
+            if self._requests:
+                self._requestTime = self._epoch
+            self._started = True
+        heldInputs.guard(self.backend, self.scheduler.condition)
+        self.scheduler.add(self)
+
+    def _requestNow(self, request, arg=None):
+        """Queues a request for the scheduler to handle right away.
+
+        Args:
+            request (int): The request to make.
+            arg (Object): Argument of the request, e.g. the time to seek to.
+        """
+        scheduler = self.scheduler
+        with scheduler.condition:
+            now = scheduler.now()
+            if request == MacroRunner._STOP:
+                if self._stopRequested:
+                    return
+                self._stopRequested = True
+                self._stopTime = now
+            else:
+                self._requests.append((request, arg))
+            if self._started:
+                self._requestTime = now
+                scheduler.reschedule(self)
+
+    def stop(self):
+        """Stops the macro and releases whatever it's holding.
+
+        Doesn't block. See join() to wait for the macro to stop.
+        """
+        self.loopInf = False
+        self._requestNow(MacroRunner._STOP)
+
+    def pause(self):
+        """Pauses the macro and releases whatever it's holding."""
+        self._requestNow(MacroRunner._PAUSE)
+
+    def resume(self):
+        """Presses whatever was released by pause() and resumes the macro."""
+        self._requestNow(MacroRunner._RESUME)
+
+    def seek(self, time):
+        """Moves playback to the passed in time of the current loop.
+
+        Events before the time are skipped, and whatever the macro would be
+        holding at the time is pressed (or released) before playback
+        continues from it. Can be called before start() to start the macro
+        part way through.
+
+        Args:
+            time (float): Seconds since the start of the loop to move to.
+                          Measured after the macro's options are applied.
+        """
+        self._requestNow(MacroRunner._SEEK, time)
+
+    def isPaused(self):
+        return self._paused
+
+    def progress(self):
+        """Returns how far along the macro is.
+
+        Return: Tuple formatted as (loops_done, events_done, num_events)
+                where events_done counts the events performed in the
+                current loop.
+        """
+        return self._loopIdx, self._cursor, len(self.timeline)
+
+    def join(self, timeout=None):
+        """Blocks until the macro is done playing back.
+
+        Args:
+            timeout (float): Most seconds to block for. None to block until
+                             the macro is done.
+        """
+        self._finished.wait(timeout)
+
+    def is_alive(self):
+        return self._started and not self._finished.is_set()
+
+    def _beginLoop(self):
+        self._loopStart = self._epoch + self._loopIdx * self.period
+        self._cursor = 0
+        self._maxLate = 0
+        self._atBoundary = False
+        self.telemetry.markLoop()
+
+    def _done(self):
+        return not self.loopInf and self._loopIdx >= self.loopNum
+
+    def nextDeadline(self):
+        """Returns when the scheduler next needs to call perform."""
+        if self._stopRequested or self._requests:
+            return self._requestTime
+        if self._paused:
+            return None
+        if self._atBoundary:
+            return self._loopStart + self.period
+        if self._cursor >= len(self.timeline):
+            return self._loopStart
+        return self._loopStart + self.timeline[self._cursor][0]
+
+    def perform(self, now):
+        """Performs every event whose deadline has passed.
+
+        Once the last event of a loop is performed, the runner waits out the
+        rest of the loop before deciding whether to loop again.
+
+        Args:
+            now (float): Current time of the scheduler's clock.
+
+        Return: Whether the macro has anything left to perform.
+        """
+        if self._stopRequested:
+            self._handleStop()
+            return False
+        requests = self._requests
+        while requests:
+            self._handleRequest(*requests.popleft(), now)
+        if self._paused:
+            return True
+
+        if self._atBoundary:
+            if self._done():
+                return False
+            self._beginLoop()
+
+        timeline = self.timeline
+        numEvents = len(timeline)
+        dispatch = self._dispatch
+        holds = self._holds
+        held = self._held
+        backend = self.backend
+        loopStart = self._loopStart
+        cursor = self._cursor
+        skipBefore = float('-inf')
+        skipping = self._policy == 'skip'
+        if cursor < numEvents:
+            late = now - (loopStart + timeline[cursor][0])
+            self._maxLate = max(self._maxLate, late)
+            policy = self._policy
+            if late > self._lateThreshold:
+                if policy == 'skip':
+                    skipBefore = now - self._lateThreshold
+                else:
+                    self.latenessCounts[policy] += 1
+                if policy == 'shift':
+                    self._epoch += late
+                    loopStart += late
+                    self._loopStart = loopStart
+
+        # Deadlines are compared absolutely since subtracting loopStart from
+        # now can round below the deadline that was just waited for.
+        while cursor < numEvents and loopStart + timeline[cursor][0] <= now:
+            _, eventType, payload, _ = timeline[cursor]
+            hold = holds[cursor]
+            isRelease = hold and not hold[1]
+            # Releases are only dropped if their press was too, so whatever
+            # was pressed is still released.
+            if (loopStart + timeline[cursor][0] < skipBefore and
+                    not isRelease) or (skipping and isRelease and
+                    hold[0] not in held):
+                self._skipped.add(cursor)
+                self.latenessCounts['skip'] += 1
+                cursor += 1
+                continue
+            dispatch[eventType](payload)
+            if hold:
+                if not hold[1]:
+                    if held.pop(hold[0], None):
+                        heldInputs.release(backend, hold[0])
+                elif hold[0] not in held:
+                    held[hold[0]] = hold
+                    heldInputs.press(backend, hold[0], hold[3])
+            cursor += 1
+        self._slot = (self._cursor, cursor)
+        self._cursor = cursor
+
+        if cursor >= numEvents:
+            self.loopLateness.append(self._maxLate)
+            self._loopIdx += 1
+            if self._done():
+                return False
+            self._atBoundary = True
+        return True
+
+    def _handleStop(self):
+        """Handles the request made by stop()."""
+        if not self._paused:
+            self._releaseHeld()
+        self._held.clear()
+        self._requests.clear()
+        self._stopped = True
+
+    def _handleRequest(self, request, arg, now):
+        """Handles a request made by pause(), resume() or seek().
+
+        Args:
+            request (int): The request to handle.
+            arg (Object): Argument the request was made with.
+            now (float): Current time of the scheduler's clock.
+        """
+        if request == MacroRunner._PAUSE and not self._paused:
+            self._releaseHeld()
+            self._paused = True
+            self._pauseTime = now
+        elif request == MacroRunner._RESUME and self._paused:
+            self._pressHeld()
+            shift = now - self._pauseTime
+            self._epoch += shift
+            self._loopStart += shift
+            self._paused = False
+        elif request == MacroRunner._SEEK:
+            self._seek(arg, self._pauseTime if self._paused else now)
+
+    def _seek(self, time, now):
+        """Moves the cursor to the first event at or after the passed in time.
+
+        Args:
+            time (float): Seconds since the start of the loop to move to.
+            now (float): Time of the scheduler's clock to treat as the
+                         passed in time.
+        """
+        if self._deadlines is None:
+            self._buildCheckpoints()
+        cursor = bisect_left(self._deadlines, time)
+        target = self._heldAt(cursor)
+
+        # Only touch what's different, so inputs held both before and after
+        # seeking aren't released and pressed again.
+        if not self._paused:
+            dispatch = self._dispatch
+            backend = self.backend
+            for inputId, (_, _, _, release) in self._held.items():
+                if inputId not in target:
+                    dispatch[release[0]](release[1])
+                    heldInputs.release(backend, inputId)
+            for inputId, (_, _, press, release) in target.items():
+                if inputId not in self._held:
+                    self._repress(press, cursor)
+                    heldInputs.press(backend, inputId, release)
+
+        self._held = target
+        self._cursor = cursor
+        self._atBoundary = False
+        self._loopStart = now - time
+        self._epoch = self._loopStart - self._loopIdx * self.period
+
+    def _buildCheckpoints(self):
+        """Indexes the timeline's deadlines and snapshots what's held."""
+        holds = self._holds
+        interval = MacroRunner._CHECKPOINT_INTERVAL
+        held = {}
+        checkpoints = []
+        for idx in range(len(holds) + 1):
+            if idx % interval == 0:
+                checkpoints.append(dict(held))
+            if idx < len(holds):
+                _applyHold(held, holds[idx])
+        self._checkpoints = checkpoints
+        self._deadlines = [event[0] for event in self.timeline]
+
+    def _heldAt(self, cursor):
+        """Returns what's held right before the event at the passed in index.
+
+        Return: Dict formatted like _held.
+        """
+        interval = MacroRunner._CHECKPOINT_INTERVAL
+        held = dict(self._checkpoints[cursor // interval])
+        holds = self._holds
+        for idx in range(cursor - cursor % interval, cursor):
+            _applyHold(held, holds[idx])
+        return held
+
+    def _releaseHeld(self):
+        """Releases everything the macro is holding, but remembers it."""
+        dispatch = self._dispatch
+        for inputId, _, _, (eventType, payload) in self._held.values():
+            dispatch[eventType](payload)
+            heldInputs.release(self.backend, inputId)
+
+    def _pressHeld(self):
+        """Presses everything released by _releaseHeld again."""
+        for inputId, _, press, release in self._held.values():
+            self._repress(press, self._cursor)
+            heldInputs.press(self.backend, inputId, release)
+
+    def _repress(self, press, cursor):
+        """Presses a held input again for resume() or seek().
+
+        Args:
+            press (Tuple): (event_type, payload) the input was pressed with.
+            cursor (int): Index of the next event to perform. Mouse buttons
+                          are pressed wherever the macro has moved the mouse
+                          to by then, rather than where they were first
+                          pressed.
+        """
+        eventType, payload = press
+        if eventType == EventEnum.MOUSE_DOWN:
+            flags = payload[2] & ~MOUSEEVENTF_MOVE_ABSOLUTE
+            position = self._mousePosition(cursor)
+            payload = (*position, flags | MOUSEEVENTF_MOVE_ABSOLUTE) \
+                    if position else (0, 0, flags)
+        self._dispatch[eventType](payload)
+
+    def _mousePosition(self, cursor):
+        """Returns where the events before cursor last moved the mouse.
+
+        Only looks back as far as the last event that moved the mouse, which
+        for a held button is at most back to where it was pressed.
+
+        Return: Tuple containing the absolute x and y coordinates, or None
+                if nothing before cursor moved the mouse.
+        """
+        timeline = self.timeline
+        for idx in range(cursor - 1, -1, -1):
+            _, eventType, payload, _ = timeline[idx]
+            if eventType == EventEnum.MOUSE_MOVE:
+                return payload
+            if (eventType == EventEnum.MOUSE_DOWN or
+                    eventType == EventEnum.MOUSE_UP) and \
+                    payload[2] & MOUSEEVENTF_MOVE:
+                return payload[:2]
+        return None
+
+    def recordSlot(self, emitted, duration):
+        """Records the events performed by the last call to perform.
+
+        Args:
+            emitted (float): When the events were flushed.
+            duration (float): How long flushing took.
+        """
+        if self._stopped and self.stopLatency is None:
+            self.stopLatency = emitted + duration - self._stopTime
+
+        timeline = self.timeline
+        loopStart = self._loopStart
+        slotStart, slotEnd = self._slot
+        skipped = self._skipped
+        for idx in range(slotStart, slotEnd):
+            if idx in skipped:
+                continue
+            event = timeline[idx]
+            self.telemetry.record(event[3], loopStart + event[0], emitted,
+                    duration)
+        skipped.clear()
+        self._slot = (slotEnd, slotEnd)
+
+    def finish(self):
+        """Puts the hotkeys back once the macro is done playing back.
+
+        Anything still held (e.g. if the macro raised an error) is released
+        first.
+        """
+        try:
+            if self._held and not self._paused:
+                self._releaseHeld()
+                self.backend.flush()
+        finally:
+            self._held = {}
+            try:
+                self._restoreHotkeys()
+            finally:
+                self._finished.set()
+                if self.onFinish:
+                    self.onFinish(self)
+
+    def _restoreHotkeys(self):
+        recorder = self.recorder
+        if self._resetHotkey:
+            idx = recorder.findHotkey(self.keys, recording=False)
+            recorder.setHotkey(idx, self.keys, self.steps, self.totalTime,
+                    self.loopNum, recording=False, options=self.options)
+        if recorder:
+            recorder.reloadHotkeys()
+
+def _applyHold(held, hold):
+    """Updates a dict of held inputs with an event's entry in _holds."""
+    if not hold:
+        return
+    if hold[1]:
+        held[hold[0]] = hold
+    else:
+        held.pop(hold[0], None)
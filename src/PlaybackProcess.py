@@ -0,0 +1,428 @@
+"""File containing the engine that plays macros back in a child process.
+
+Playback shares the GIL with the GUI, so the GUI being busy (e.g. rebuilding
+thousands of step widgets) delays playback. PlaybackProcess moves the
+PlaybackScheduler into a child process instead. Each macro's steps are
+packed into arrays in shared memory for the child to read, and commands
+are sent over a pipe.
+
+Messages sent to the child are tuples starting with the command:
+
+    ('play', macroId, shmName, totalTime, loopNum, options, config)
+    ('stop', macroId)
+    ('pause', macroId)
+    ('resume', macroId)
+    ('seek', macroId, time)
+    ('panic',)
+    ('quit',)
+
+The child only ever replies with ('done', macroId, loopLateness,
+stopLatency, latenessCounts) once a macro is done playing back.
+"""
+
+from multiprocessing import Process, Pipe, shared_memory
+from Scheduler import DeadlineScheduler
+from StepTypes import StepEnum
+from threading import Thread, Lock, Event
+from array import array
+import traceback
+import struct
+import time
+
+# Number of steps and number of bytes of key data.
+_HEADER = struct.Struct('<qq')
+
+# Number of floats stored for each step: start, hold, and up to 4 values
+# of data.
+_FLOATS = 6
+
+def packSteps(steps):
+    """Packs a macro's steps into a new block of shared memory.
+
+    The block is laid out as the header, then _FLOATS doubles per step, then
+    the offset of each step's key in the key data (plus the end), then each
+    step's type, and last the UTF-8 key data. Coordinates are stored as
+    doubles too, which hold recorded ints and loaded floats exactly, so the
+    child rounds them the same way as playing back in process.
+
+    Args:
+        steps (list): List of tuples containing the data of each step. More
+                      details in KeyListWidgetStep.
+
+    Return: The SharedMemory containing the steps. The caller is responsible
+            for unlinking it.
+    """
+    floats = array('d')
+    offsets = array('i', [0])
+    types = array('b')
+    keys = bytearray()
+    for stepType, data, hold, start in steps:
+        values = [start, hold]
+        if stepType == StepEnum.KEY:
+            keys += data.encode()
+        elif stepType == StepEnum.MOUSE_SCROLL:
+            values.append(data)
+        elif stepType == StepEnum.MOUSE_LEFT_DRAG or \
+                stepType == StepEnum.MOUSE_RIGHT_DRAG:
+            values += [*data[0], *data[1]]
+        elif stepType != StepEnum.ACTIVE_WAIT:
+            values += data
+        floats.extend(values + [0] * (_FLOATS - len(values)))
+        offsets.append(len(keys))
+        types.append(stepType.value)
+
+    parts = [_HEADER.pack(len(steps), len(keys)), floats.tobytes(),
+            offsets.tobytes(), types.tobytes(), bytes(keys)]
+    size = sum(len(part) for part in parts)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    pos = 0
+    for part in parts:
+        shm.buf[pos:pos + len(part)] = part
+        pos += len(part)
+    return shm
+
+def unpackSteps(buf):
+    """Reads steps packed by packSteps.
+
+    Args:
+        buf (memoryview): Contents of the shared memory.
+
+    Return: List of step tuples.
+    """
+    numSteps, numKeyBytes = _HEADER.unpack_from(buf)
+    pos = _HEADER.size
+    floats = array('d')
+    floats.frombytes(buf[pos:pos + numSteps * _FLOATS * floats.itemsize])
+    pos += len(floats) * floats.itemsize
+    offsets = array('i')
+    offsets.frombytes(buf[pos:pos + (numSteps + 1) * offsets.itemsize])
+    pos += len(offsets) * offsets.itemsize
+    types = array('b')
+    types.frombytes(buf[pos:pos + numSteps])
+    pos += numSteps
+    keys = bytes(buf[pos:pos + numKeyBytes])
+
+    steps = []
+    for idx in range(numSteps):
+        stepType = StepEnum(types[idx])
+        start, hold, a, b, c, d = floats[idx * _FLOATS:(idx + 1) * _FLOATS]
+        if stepType == StepEnum.KEY:
+            data = keys[offsets[idx]:offsets[idx + 1]].decode()
+        elif stepType == StepEnum.MOUSE_SCROLL:
+            data = a
+        elif stepType == StepEnum.MOUSE_LEFT_DRAG or \
+                stepType == StepEnum.MOUSE_RIGHT_DRAG:
+            data = ((a, b), (c, d))
+        elif stepType == StepEnum.ACTIVE_WAIT:
+            data = None
+        else:
+            data = (a, b)
+        steps.append((stepType, data, hold, start))
+    return steps
+
+class RemoteRunner():
+    """Handle to a macro playing back in the child process.
+
+    Has the same interface as MacroRunner, and takes care of the hotkeys
+    the same way.
+
+    Attributes:
+        engine (PlaybackProcess): Engine playing back the macro.
+        macroId (int): Identifies the macro to the child process.
+        loopLateness (list): The latest any event fired in each loop. Only
+                             filled in once the macro is done.
+        stopLatency (float): See MacroRunner. Only filled in once the macro
+                             is done.
+        latenessCounts (dict): See MacroRunner. Only filled in once the
+                               macro is done.
+    """
+
+    def __init__(self, engine, macroId, steps, totalTime, loopNum, keys,
+            recorder, options):
+        self.engine = engine
+        self.macroId = macroId
+        self.steps = steps
+        self.totalTime = totalTime
+        self.loopNum = loopNum
+        self.keys = keys
+        self.recorder = recorder
+        self.options = options
+        self.loopLateness = []
+        self.stopLatency = None
+        self.latenessCounts = {}
+        self.shm = None
+        self._resetHotkey = False
+        self._started = False
+        self._finished = Event()
+
+    def start(self, config):
+        """Hands the macro over to the child process.
+
+        Args:
+            config (dict): Playback section of the config.
+        """
+        recorder = self.recorder
+        if recorder:
+            recorder.backupHotkeys()
+        if self.loopNum == -1 and recorder:
+            recorder.setMacroToggle(self.keys, self.stop)
+            self._resetHotkey = True
+
+        self.shm = packSteps(self.steps)
+        self._started = True
+        try:
+            self.engine._send(('play', self.macroId, self.shm.name,
+                    self.totalTime, self.loopNum, self.options, config))
+        except OSError:
+            # The child died. Whichever of us and the engine's reader takes
+            # the runner out of runners cleans it up.
+            if self.engine.runners.pop(self.macroId, None):
+                self.finish([], None, {})
+            raise
+
+    def stop(self):
+        self.engine._send(('stop', self.macroId))
+
+    def pause(self):
+        self.engine._send(('pause', self.macroId))
+
+    def resume(self):
+        self.engine._send(('resume', self.macroId))
+
+    def seek(self, time):
+        self.engine._send(('seek', self.macroId, time))
+
+    def join(self, timeout=None):
+        self._finished.wait(timeout)
+
+    def is_alive(self):
+        return self._started and not self._finished.is_set()
+
+    def getLoopLateness(self):
+        return self.loopLateness
+
+    def getLatenessCounts(self):
+        return self.latenessCounts
+
+    def finish(self, loopLateness, stopLatency, latenessCounts):
+        """Cleans up once the child process is done with the macro."""
+        self.loopLateness = loopLateness
+        self.stopLatency = stopLatency
+        self.latenessCounts = latenessCounts
+        try:
+            self.shm.close()
+            self.shm.unlink()
+            recorder = self.recorder
+            if self._resetHotkey:
+                idx = recorder.findHotkey(self.keys, recording=False)
+                recorder.setHotkey(idx, self.keys, self.steps,
+                        self.totalTime, self.loopNum, recording=False,
+                        options=self.options)
+            if recorder:
+                recorder.reloadHotkeys()
+        finally:
+            self._finished.set()
+
+class PlaybackProcess():
+    """Plays back macros in a child process.
+
+    If the child process dies, every macro it was playing back is finished
+    and a new child is started by the thread reading from the old one, so
+    nothing waiting on playback has to start it. A child that dies within
+    _MIN_UPTIME seconds of starting isn't restarted, so one that can't start
+    at all doesn't restart forever.
+
+    Attributes:
+        backendFactory (func): See __init__.
+        spinThreshold (float): See DeadlineScheduler.
+        process (Process): The child process.
+        conn (Connection): Our end of the pipe to the child process.
+        runners (dict): Mapping of macro id -> RemoteRunner of every macro
+                        the child process is playing back.
+    """
+
+    _MIN_UPTIME = 1
+
+    def __init__(self, backendFactory,
+            spinThreshold=DeadlineScheduler.DEFAULT_SPIN_THRESHOLD):
+        """Starts the child process.
+
+        Args:
+            backendFactory (func): Picklable function (e.g. a class) the
+                                   child calls to create the backend it
+                                   plays back with.
+            spinThreshold (float): See DeadlineScheduler.
+        """
+        self.backendFactory = backendFactory
+        self.spinThreshold = spinThreshold
+        self.runners = {}
+        self._count = 0
+        self._lock = Lock()
+        self._quitting = False
+        self._startChild()
+
+    def _startChild(self):
+        """Starts a child process and a thread to read from it."""
+        conn, childConn = Pipe()
+        process = Process(target=_serve, args=(childConn,
+                self.backendFactory, self.spinThreshold), daemon=True)
+        process.start()
+        childConn.close()
+        with self._lock:
+            self.conn = conn
+            self.process = process
+        Thread(target=self._read, args=(conn, time.monotonic()),
+                daemon=True).start()
+
+    def _send(self, message):
+        with self._lock:
+            self.conn.send(message)
+
+    def play(self, steps, totalTime, loopNum, keys, recorder, config,
+            options=None):
+        """Starts playing back a macro in the child process.
+
+        Args:
+            steps (list): List of tuples containing the data of each step.
+                          More details in KeyListWidgetStep.
+            totalTime (float): Time it takes to run the macro.
+            loopNum (int): Number of times to run the macro. -1 to run
+                           until the hotkey is pressed again.
+            keys (set): Set of KeyCodes which make up the hotkey that maps
+                        to the macro.
+            recorder (Hotkeys): Hotkey recorder used throughout the program.
+            config (dict): Playback section of the config.
+            options (dict): Playback options of the macro. See
+                            MacroCompiler.retimeSteps.
+
+        Return: RemoteRunner of the macro.
+        """
+        with self._lock:
+            self._count += 1
+            macroId = self._count
+        runner = RemoteRunner(self, macroId, steps, totalTime, loopNum, keys,
+                recorder, options)
+        self.runners[macroId] = runner
+        runner.start(config)
+        return runner
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def panic(self):
+        """Stops every macro and releases everything the child is holding.
+
+        Does nothing if the child process died, since it isn't holding
+        anything.
+        """
+        try:
+            self._send(('panic',))
+        except OSError:
+            pass
+
+    def shutdown(self):
+        """Releases everything and stops the child process."""
+        self._quitting = True
+        try:
+            self._send(('quit',))
+        except OSError:
+            pass
+        self.process.join(1)
+
+    def _read(self, conn, started):
+        """Reads what a child process sends back until it exits.
+
+        Args:
+            conn (Connection): Our end of the pipe to the child process.
+            started (float): time.monotonic() when the child was started.
+        """
+        while True:
+            try:
+                _, macroId, *results = conn.recv()
+            except (EOFError, OSError):
+                break
+            runner = self.runners.pop(macroId, None)
+            if runner:
+                runner.finish(*results)
+
+        # The child died, so none of its macros will ever finish on their
+        # own.
+        for macroId in list(self.runners):
+            runner = self.runners.pop(macroId, None)
+            if runner:
+                runner.finish(runner.loopLateness, None,
+                        runner.latenessCounts)
+        conn.close()
+
+        if self._quitting:
+            return
+        if time.monotonic() - started < PlaybackProcess._MIN_UPTIME:
+            print('Playback process died right after starting, not '
+                    'restarting it')
+            return
+        self._startChild()
+
+def _serve(conn, backendFactory, spinThreshold):
+    """Runs in the child process, playing back whatever it's sent."""
+    from MacroRunner import MacroRunner
+    from Scheduler import PlaybackScheduler
+    from HeldInputs import heldInputs
+
+    backend = backendFactory()
+    scheduler = PlaybackScheduler(spinThreshold)
+    runners = {}
+    sendLock = Lock()
+
+    def onFinish(runner):
+        runners.pop(runner.macroId, None)
+        with sendLock:
+            conn.send(('done', runner.macroId, runner.loopLateness,
+                    runner.stopLatency, runner.latenessCounts))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            message = ('quit',)
+        command = message[0]
+
+        if command == 'play':
+            _, macroId, shmName, totalTime, loopNum, options, config = \
+                    message
+            # A macro that can't be played back (e.g. bad options) is
+            # reported as done right away rather than taking the child
+            # down with it.
+            try:
+                shm = shared_memory.SharedMemory(name=shmName)
+                try:
+                    steps = unpackSteps(shm.buf)
+                finally:
+                    shm.close()
+                runner = MacroRunner(steps, totalTime, loopNum, None, None,
+                        backend, repeatDelay=config['repeatDelay'],
+                        repeatRate=config['repeatRate'], options=options,
+                        scheduler=scheduler, dragRate=config['dragRate'],
+                        onFinish=onFinish, latency=config['latency'])
+            except Exception:
+                traceback.print_exc()
+                with sendLock:
+                    conn.send(('done', macroId, [], None, {}))
+                continue
+            runner.macroId = macroId
+            runners[macroId] = runner
+            runner.start()
+        elif command == 'panic' or command == 'quit':
+            scheduler.removeAll()
+            heldInputs.releaseAll()
+            if command == 'quit':
+                break
+        elif message[1] in runners:
+            runner = runners[message[1]]
+            if command == 'stop':
+                runner.stop()
+            elif command == 'pause':
+                runner.pause()
+            elif command == 'resume':
+                runner.resume()
+            elif command == 'seek':
+                runner.seek(message[2])
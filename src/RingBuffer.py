@@ -0,0 +1,79 @@
+"""File containing the queue input hooks hand recorded input over with.
+
+Input hooks run on the listener threads, and Windows drops input if they
+take too long to return. Instead of building steps themselves, the hooks
+just push a record into a RingBuffer, and the GUI thread drains it in
+batches.
+"""
+
+class RingBuffer():
+    """Preallocated single producer, single consumer queue.
+
+    No locks are taken. Only the producer moves head and only the consumer
+    moves tail, and a slot is always written before head is moved past it,
+    so the consumer never reads a slot that's still being written. Pushing
+    onto a full buffer drops the record instead of waiting.
+
+    To avoid waking the consumer for every record, push only asks for the
+    consumer to be woken if it hasn't been since it last drained.
+
+    Attributes:
+        capacity (int): Most records the buffer holds at once.
+        slots (list): Preallocated storage for the records.
+        head (int): Number of records ever pushed.
+        tail (int): Number of records ever drained.
+        overflows (int): Number of records dropped because the buffer was
+                         full.
+    """
+
+    DEFAULT_CAPACITY = 4096
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.head = 0
+        self.tail = 0
+        self.overflows = 0
+        self._woken = False
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, record):
+        """Adds a record to the buffer. Only called by the producer.
+
+        Args:
+            record (Object): Record to add.
+
+        Return: Whether the consumer needs to be woken to drain the buffer.
+        """
+        head = self.head
+        if head - self.tail >= self.capacity:
+            self.overflows += 1
+            return False
+        self.slots[head % self.capacity] = record
+        self.head = head + 1
+
+        # Checked after publishing the record, so if the consumer clears
+        # _woken after this, it's guaranteed to see the record.
+        if self._woken:
+            return False
+        self._woken = True
+        return True
+
+    def drain(self):
+        """Removes every record in the buffer. Only called by the consumer.
+
+        Return: List of the records in the order they were pushed.
+        """
+        self._woken = False
+        slots = self.slots
+        capacity = self.capacity
+        tail = self.tail
+        head = self.head
+        records = []
+        for idx in range(tail, head):
+            records.append(slots[idx % capacity])
+            slots[idx % capacity] = None
+        self.tail = head
+        return records
@@ -0,0 +1,259 @@
+"""File containing the logic to wait for playback deadlines."""
+
+from Clock import defaultClock
+from threading import Thread, Condition
+import traceback
+import heapq
+
+class DeadlineScheduler():
+    """Waits until deadlines rather than polling at a fixed rate.
+
+    Sleeping is only accurate to within a few milliseconds, so we sleep until
+    just before the deadline and then spin for the rest of the time. That's
+    only the case once the clock's resolution is raised (see
+    RealClock.raiseResolution), otherwise Windows can oversleep by a whole
+    15.6 ms timer tick.
+
+    Attributes:
+        spinThreshold (float): How many seconds before a deadline to stop
+                               sleeping and start spinning.
+        clock (RealClock | VirtualClock): Clock deadlines are measured in.
+                                          Virtual clocks are just moved
+                                          forward to each deadline.
+    """
+
+    # Sleeps with a raised resolution can still overshoot by a little over a
+    # millisecond.
+    DEFAULT_SPIN_THRESHOLD = .002
+
+    def __init__(self, spinThreshold=DEFAULT_SPIN_THRESHOLD,
+            clock=defaultClock):
+        """Initializes instance variables.
+
+        Args:
+            spinThreshold (float): How many seconds before a deadline to stop
+                                   sleeping and start spinning.
+            clock (RealClock | VirtualClock): Clock deadlines are measured in.
+        """
+        self.spinThreshold = spinThreshold
+        self.clock = clock
+
+    def now(self):
+        """Returns the current time of the clock deadlines are measured in."""
+        return self.clock.now()
+
+    def waitUntil(self, deadline, condition=None):
+        """Blocks until the passed in deadline.
+
+        Args:
+            deadline (float): Time returned by now() to wait until.
+            condition (Condition): If passed in, sleep by waiting on this
+                                   condition instead, so notifying it stops
+                                   the wait early. Must already be held.
+
+        Return: False if the wait was stopped early, True otherwise.
+        """
+        clock = self.clock
+        if not clock.realtime:
+            clock.advanceTo(deadline)
+            return True
+
+        remaining = deadline - clock.now()
+        if remaining > self.spinThreshold:
+            if condition is None:
+                clock.sleep(remaining - self.spinThreshold)
+            elif condition.wait(remaining - self.spinThreshold):
+                return False
+        while clock.now() < deadline:
+            pass
+        return True
+
+class PlaybackScheduler(Thread):
+    """Single thread that plays back every running macro.
+
+    Each macro is a stream of events (see MacroRunner). The scheduler keeps
+    a heap of every stream's next deadline and merges them, so however many
+    macros are running, only this thread wakes up to send their input.
+    Everything due in the same slot is sent with one flush per backend.
+
+    Streams can be added, removed, and rescheduled at any time from any
+    thread. Doing so wakes the scheduler in case the stream is due before
+    whatever it was waiting for.
+
+    The clock's resolution is raised while any stream is waiting for a
+    deadline, and restored whenever the scheduler runs out of deadlines.
+
+    A stream is any object with the following:
+
+        backend (InputBackend): Where the stream's events are sent.
+        nextDeadline(): Returns when the stream next needs to perform, or
+                        None if it's paused until it's rescheduled.
+        perform(now): Performs everything due by now and returns whether the
+                      stream has anything left to perform.
+        recordSlot(emitted, duration): Called after the events performed
+                                       were flushed.
+        finish(): Called once the stream is done, removed, or raised an
+                  error. Always called on the scheduler's thread or while
+                  the scheduler is stopped, so it's safe to send input.
+
+    Attributes:
+        deadlines (DeadlineScheduler): Used to wait for each deadline.
+        condition (Condition): Guards the heap and is notified whenever it
+                               changes.
+    """
+
+    def __init__(self, spinThreshold=DeadlineScheduler.DEFAULT_SPIN_THRESHOLD,
+            clock=defaultClock):
+        """Initializes instance variables.
+
+        The thread is started when the first stream is added.
+
+        Args:
+            spinThreshold (float): See DeadlineScheduler.
+            clock (RealClock | VirtualClock): Clock every stream's deadlines
+                                              are measured in.
+        """
+        super().__init__(daemon=True)
+        self.deadlines = DeadlineScheduler(spinThreshold, clock)
+        self.condition = Condition()
+
+        # Heap of [deadline, order added, stream, valid] lists. Removed
+        # streams are marked invalid rather than searched for in the heap.
+        self._heap = []
+        self._entries = {}
+        self._count = 0
+
+    def now(self):
+        return self.deadlines.now()
+
+    def _push(self, stream):
+        """Adds a stream to the heap. Condition must be held."""
+        entry = [stream.nextDeadline(), self._count, stream, True]
+        self._count += 1
+        self._entries[stream] = entry
+        if entry[0] is not None:
+            heapq.heappush(self._heap, entry)
+
+    def add(self, stream):
+        """Starts playing back the passed in stream.
+
+        Args:
+            stream (Object): Stream to add. See the class docstring.
+        """
+        with self.condition:
+            if not self.is_alive():
+                self.start()
+            self._push(stream)
+            self.condition.notify()
+
+    def remove(self, stream):
+        """Stops playing back the passed in stream and finishes it.
+
+        Does nothing if the stream isn't being played back.
+
+        Args:
+            stream (Object): Stream to remove.
+        """
+        with self.condition:
+            entry = self._entries.pop(stream, None)
+            if entry:
+                entry[3] = False
+                _finish(stream)
+                self.condition.notify()
+
+    def removeAll(self):
+        """Stops playing back and finishes every stream.
+
+        Streams are finished in the reverse order they were added, so state
+        they back up and restore (e.g. hotkeys) ends up how it started.
+
+        Return: Number of streams removed.
+        """
+        with self.condition:
+            entries = sorted(self._entries.values(), key=lambda entry:
+                    entry[1], reverse=True)
+            self._entries = {}
+            for entry in entries:
+                entry[3] = False
+                _finish(entry[2])
+            self.condition.notify()
+        return len(entries)
+
+    def reschedule(self, stream):
+        """Asks the passed in stream for its next deadline again.
+
+        Does nothing if the stream isn't being played back.
+
+        Args:
+            stream (Object): Stream to reschedule.
+        """
+        with self.condition:
+            entry = self._entries.get(stream)
+            if entry:
+                entry[3] = False
+                self._push(stream)
+                self.condition.notify()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def run(self):
+        heap = self._heap
+        condition = self.condition
+        clock = self.deadlines.clock
+        raised = False
+        with condition:
+            while True:
+                if not heap:
+                    if raised:
+                        clock.restoreResolution()
+                        raised = False
+                    condition.wait()
+                elif not heap[0][3]:
+                    heapq.heappop(heap)
+                else:
+                    if not raised:
+                        clock.raiseResolution()
+                        raised = True
+                    if self.deadlines.waitUntil(heap[0][0], condition):
+                        self._runSlot()
+
+    def _runSlot(self):
+        """Performs every stream that's due. Condition must be held."""
+        heap = self._heap
+        now = self.deadlines.now()
+        due = []
+        while heap and heap[0][0] <= now:
+            _, _, stream, valid = heapq.heappop(heap)
+            if valid:
+                del self._entries[stream]
+                due.append(stream)
+
+        backends = {}
+        alive = []
+        for stream in due:
+            backends[id(stream.backend)] = stream.backend
+            try:
+                alive.append(stream.perform(now))
+            except Exception:
+                traceback.print_exc()
+                alive.append(False)
+
+        emitted = self.deadlines.now()
+        for backend in backends.values():
+            backend.flush()
+        duration = self.deadlines.now() - emitted
+
+        for stream, isAlive in zip(due, alive):
+            stream.recordSlot(emitted, duration)
+            if isAlive:
+                self._push(stream)
+            else:
+                _finish(stream)
+
+def _finish(stream):
+    """Finishes a stream without letting its errors stop the scheduler."""
+    try:
+        stream.finish()
+    except Exception:
+        traceback.print_exc()
@@ -2,33 +2,10 @@
 
 import pynput._util.win32_vks as VK
 from pynput.keyboard import Key, KeyCode
-from enum import Enum
-
-class StepEnum(Enum):
-    """Enums for step types."""
-    ACTIVE_WAIT = 0
-    MOUSE_LEFT = 1
-    MOUSE_RIGHT = 2
-    MOUSE_SCROLL = 3
-    MOUSE_LEFT_DRAG = 4
-    MOUSE_RIGHT_DRAG = 5
-    KEY = 6
-
-    def __lt__(self, other):
-        """Less than operator overload for enums.
-
-        It doesn't actually matter which values are greater than which. We just
-        need to override this because the priority queue in MacroRunner tie
-        tie breaks by looking at StepEnum.
-
-        Args:
-            other (StepEnum): The other StepEnum to compare to.
-
-        Return: True if the value of other is greater than self's value.
-                False otherwise.
-        """
-        return self.value < other.value
 
+# Kept here as well so everything that used to import StepEnum from this file
+# still can.
+from StepTypes import StepEnum
 
 _ENUM_CONST = {
     StepEnum.ACTIVE_WAIT: ('image: url(:/images/images/active_wait.png);\npadding:3px;', 'Active Wait Time'),
@@ -154,13 +131,6 @@ _VK_CONST = {
     Key.up : VK.UP,
 }
 
-_VK_KEYS = {
-    Key.up,
-    Key.down,
-    Key.left,
-    Key.right,
-}
-
 def stepImage(step):
     return _ENUM_CONST[step][0]
 
@@ -170,8 +140,8 @@ def stepDescriptor(step):
 def keyConst(key):
     return _KEY_CONSTANTS[key]
 
+def keyNames():
+    return _KEY_CONSTANTS.keys()
+
 def keyToVK(key):
     return _VK_CONST.get(key, key)
-
-def isVKPress(key):
-    return key in _VK_KEYS
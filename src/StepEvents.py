@@ -1,14 +1,18 @@
 """File containing all step events.
 
-Each StepEvent is a callback called when the respective signal is emitted.
-The StepEvent will update what the list widget displays.
+Each StepEvent is a callback called when the respective input is recorded.
+The StepEvent will update the list widget's recorded steps, which the list
+widget displays later on.
 Event state is also kept by a shared dictionary (initialized in KeyWatcher).
+
+Events carry the clock time the input hook saw them at, so hold times are
+measured between the hook firing for the press and for the release.
 """
 
 from util import synchronize, parseKey
 from StepConstants import StepEnum
+from Clock import defaultClock
 from pynput import mouse
-import time
 
 class StepEvent():
     """Base class for all step events.
@@ -17,29 +21,28 @@ class StepEvent():
         listWidget (QListWidget): List widget to update.
         keysDown (dict): Mapping of keys currently pressed
                          (or if scrolling / clicking) to a tuple containing
-                         their time held display and the time they were 
-                         detected.
-        lock (Lock): Threading lock to prevent race conditions in the keysDown
-                     dict which can happen between the display updater thread
-                     and the listener threads.
+                         the index of their recorded step, the time they
+                         were detected and their step type.
+        lock (Lock): Threading lock guarding the keysDown dict.
+        clock (RealClock): Clock used to time events.
     """
-    def __init__(self, listWidget, keysDown, lock):
+    def __init__(self, listWidget, keysDown, lock, clock=defaultClock):
         """Initializes instance variables.
 
         Args:
             listWidget (QListWidget): List widget to emit signals to.
             keysDown (dict): Mapping of keys currently pressed
                              (or if scrolling / clicking) to a tuple containing
-                             their time held display and the time they were 
-                             detected.
-            lock (Lock): Threading lock to prevent race conditions in the
-                         keysDown dict which can happen between the display
-                         updater thread and the listener threads.
+                             the index of their recorded step, the time they
+                             were detected and their step type.
+            lock (Lock): Threading lock guarding the keysDown dict.
+            clock (RealClock): Clock used to time events.
 
         """
         self.listWidget = listWidget
         self.keysDown = keysDown
         self.lock = lock
+        self.clock = clock
 
     @synchronize
     def _dictAdd(self, key, val):
@@ -58,10 +61,31 @@ class StepEvent():
         Args:
             key (Object): Key whose corresponding key value pair will be deleted
                           from the dictionary.
+
+        Return: The deleted value, or None if the key wasn't in the
+                dictionary.
+        """
+        return self.keysDown.pop(key, None)
+
+    def _endHold(self, key, timestamp):
+        """Deletes a key from the keys down dictionary and sets its hold time.
+
+        Args:
+            key (Object): Key to delete.
+            timestamp (float): Clock time the hold ended at.
         """
-        timeTup = self.keysDown.get(key, None)
+        timeTup = self._dictDel(key)
         if timeTup != None:
-            del self.keysDown[key]
+            self.listWidget.updateRecordedStep(timeTup[0],
+                    holdTime=timestamp - timeTup[1])
+
+    def _endWait(self, timestamp):
+        """Ends the active wait step, if any, when the user does something.
+
+        Args:
+            timestamp (float): Clock time the user did something at.
+        """
+        self._endHold(StepEnum.ACTIVE_WAIT, timestamp)
 
 
 class KeyboardEvent(StepEvent):
@@ -69,7 +93,7 @@ class KeyboardEvent(StepEvent):
 
     KEY_PRESS_DELTA = 0.2
 
-    def onPress(self, startTime, key):
+    def onPress(self, startTime, timestamp, key):
         """Callback for when a key is pressed.
 
         This adds a new step to the list widget as well as updating the
@@ -78,50 +102,55 @@ class KeyboardEvent(StepEvent):
         Args:
             startTime (float): When this step started relative to the start
                                of the macro.
+            timestamp (float): Clock time the key was pressed at.
             key (KeyCode): Key pressed.
         """
         key = str(key)
         if key not in self.keysDown:
-            press = self.listWidget.listWidgetAddStep(
-                    startTime, StepEnum.KEY, parseKey(key)).getPress()
-            self._dictAdd(key, (press, time.time(), StepEnum.KEY))
+            self._endWait(timestamp)
+            stepIdx = self.listWidget.addRecordedStep(startTime, StepEnum.KEY,
+                    parseKey(key))
+            self._dictAdd(key, (stepIdx, timestamp, StepEnum.KEY))
 
-    def onRelease(self, startTime, key):
+    def onRelease(self, startTime, timestamp, key):
         """Callback for when a key is released.
 
-        Just deletes the key from the state dictionary.
+        Deletes the key from the state dictionary and sets how long it was
+        held for.
 
         Args:
             startTime (float): When this step started relative to the start
                                of the macro. (Actually probably don't need this 
                                for this callback).
+            timestamp (float): Clock time the key was released at.
             key (KeyCode): Key pressed.
         """
-        self._dictDel(str(key))
+        self._endHold(str(key), timestamp)
 
 class ClickEvent(StepEvent):
     """Event class for click events.
 
     Attributes:
         dataCache (dict): Mapping of type of click -> data of the click. The
-                          data is a tuple containing the widget that displays
-                          the data, and the coordinates of the initial click.
-                          This is used to determine if the the event is actually
-                          a drag event and to update the widget accordingly if
-                          it is a drag event.
+                          data is a tuple containing the index of the click's
+                          recorded step, and the coordinates of the initial
+                          click. This is used to determine if the the event is
+                          actually a drag event and to update the step
+                          accordingly if it is a drag event.
     """
-    def __init__(self, listWidget, keysDown, lock):
+    def __init__(self, listWidget, keysDown, lock, clock=defaultClock):
         """Initializes instnace variables.
 
         Args:
             listWidget (QListWidget): See StepEvent.
             keysDown (dict): See StepEvent.
             lock (Lock): See StepEvent.
+            clock (RealClock): See StepEvent.
         """
-        super().__init__(listWidget, keysDown, lock)
+        super().__init__(listWidget, keysDown, lock, clock)
         self.dataCache = {StepEnum.MOUSE_LEFT: None, StepEnum.MOUSE_RIGHT: None}
 
-    def onClick(self, startTime, x, y, button, pressed):
+    def onClick(self, startTime, timestamp, x, y, button, pressed):
         """Callback for when a key is pressed.
 
         This function adds the appropriate step enum into the state dictionary.
@@ -130,6 +159,8 @@ class ClickEvent(StepEvent):
         Args:
             startTime (float): When this step started relative to the start
                                of the macro.
+            timestamp (float): Clock time the button was pressed or released
+                               at.
             x (int): X coordinate of the click.
             y (int): Y coordinate of the click.
             button (Enum (I think?)): Which mouse button clicked.
@@ -138,38 +169,43 @@ class ClickEvent(StepEvent):
         stepType = StepEnum.MOUSE_LEFT if button == mouse.Button.left else \
                 StepEnum.MOUSE_RIGHT
         if pressed:
-            container = self.listWidget.listWidgetAddStep(
-                    startTime, stepType, (x, y))
-            press = container.getPress()
-            self._dictAdd(button, (press, time.time(), stepType))
-            self.dataCache[stepType] = (container, x, y)
+            self._endWait(timestamp)
+            stepIdx = self.listWidget.addRecordedStep(startTime, stepType,
+                    (x, y))
+            self._dictAdd(button, (stepIdx, timestamp, stepType))
+            self.dataCache[stepType] = (stepIdx, x, y)
         else:
-            self._dictDel(button)
-            # If user dragged mouse, update container
-            container, oldX, oldY = self.dataCache[stepType]
+            self._endHold(button, timestamp)
+            # If user dragged mouse, update the step
+            stepIdx, oldX, oldY = self.dataCache[stepType]
             if oldX != x or oldY != y:
-                container.clickToDrag(stepType, (oldX, oldY), (x, y))
+                dragType = StepEnum.MOUSE_LEFT_DRAG \
+                        if stepType == StepEnum.MOUSE_LEFT \
+                        else StepEnum.MOUSE_RIGHT_DRAG
+                self.listWidget.updateRecordedStep(stepIdx, stepType=dragType,
+                        data=((oldX, oldY), (x, y)))
 
 class WaitEvent(StepEvent):
     """Event class for when the user isn't doing anything."""
 
-    def onWait(self, startTime):
-        """Callback for when the user isn't doing anything.
+    def onWait(self, startTime, timestamp):
+        """Callback for when the user hasn't done anything for a while.
+
+        The wait lasts until the user does something again.
 
         Args:
-            startTime (float): When this step started relative to the start
-                               of the macro.
+            startTime (float): When the user stopped doing anything relative
+                               to the start of the macro.
+            timestamp (float): Clock time the user stopped doing anything at.
         """
 
         # If the event state dictionary is empty, then the user isn't doing
         # anything.
         if len(self.keysDown) == 0:
-            press = self.listWidget.listWidgetAddStep(
-                    startTime, StepEnum.ACTIVE_WAIT, None).getPress()
-            self._dictAdd(StepEnum.ACTIVE_WAIT, (press, time.time(),
+            stepIdx = self.listWidget.addRecordedStep(startTime,
+                    StepEnum.ACTIVE_WAIT)
+            self._dictAdd(StepEnum.ACTIVE_WAIT, (stepIdx, timestamp,
                     StepEnum.ACTIVE_WAIT))
-        elif StepEnum.ACTIVE_WAIT in self.keysDown and len(self.keysDown) > 1:
-            self._dictDel(StepEnum.ACTIVE_WAIT)
 
 class ReleaselessEvent(StepEvent):
     """Event parent class for events that can't detect if the event is finished.
@@ -180,17 +216,17 @@ class ReleaselessEvent(StepEvent):
     the list widget, we don't want to add each individual scroll tick
     or coordinate change. Instead, we condense the event into one step
     and when the event doesn't occur for some time offset, we 
-    say that event is finished.
+    say that event is finished. KeyWatcher arms a timer for when that is,
+    and calls finish once it fires.
 
     Attributes:
         data (Tuple | float): Step data for this event.
         stopStart (float): When the user stopped performing the event.
-        stopDelta (float): Time since the user stopped performing the event.
-        endPosWidget (QWidget): Widget to display the step's data.
-        check (bool): Whether or not the event occured since the last update.
+        stepIdx (int): Index of the event's recorded step. None if the event
+                       isn't being performed.
     """
 
-    def __init__(self, data, listWidget, keysDown, lock):
+    def __init__(self, data, listWidget, keysDown, lock, clock=defaultClock):
         """Initializes base class and 0 initializes instance variables.
 
         Args:
@@ -198,8 +234,9 @@ class ReleaselessEvent(StepEvent):
             listWidget (QListWidget): See StepEvent.
             keysDown (dict): See StepEvent.
             lock (Lock): See StepEvent.
+            clock (RealClock): See StepEvent.
         """
-        super().__init__(listWidget, keysDown, lock)
+        super().__init__(listWidget, keysDown, lock, clock)
         self.reset(data)
 
     def reset(self, data):
@@ -212,16 +249,15 @@ class ReleaselessEvent(StepEvent):
         """
         self.data = data
         self.stopStart = 0
-        self.stopDelta = 0
-        self.endPosWidget = None
-        self.check = False
+        self.stepIdx = None
 
-    def _onEvent(self, startTime, stepType, data, increment=False):
+    def _onEvent(self, startTime, timestamp, stepType, data, increment=False):
         """Callback for when this event occurs.
 
         Args:
             startTime (float): When this step started relative to the start
                                of the macro.
+            timestamp (float): Clock time the event occurred at.
             stepType (StepEnum): Type of this step.
             data (Tuple | float): Step data for this event.
             incremement (bool): Whether or not to add the passed in data
@@ -232,18 +268,16 @@ class ReleaselessEvent(StepEvent):
 
         # If the event isn't already in the event state dictionary.
         if stepType not in self.keysDown:
+            self._endWait(timestamp)
             defaultData = self.data if increment else [self.data, data]
-            container = self.listWidget.listWidgetAddStep(
-                    startTime, stepType, defaultData)
-
-            press = container.getPress()
-            self.endPosWidget = container.getEditable()
-            self.stopStart = time.time()
+            self.stepIdx = self.listWidget.addRecordedStep(startTime,
+                    stepType, defaultData)
+            self.stopStart = timestamp
 
             # stepType twice is redundant but needed to keep tuple
             # sizes the same.
-            self._dictAdd(stepType, (press, time.time(), stepType))
-        # Otherwise, update the current event data.
+            self._dictAdd(stepType, (self.stepIdx, timestamp, stepType))
+        # Otherwise, update the current event data and step.
         else:
             if increment:
                 self.data += data
@@ -251,15 +285,15 @@ class ReleaselessEvent(StepEvent):
                 self.data = data
 
             # The event occurred just now, so reset stopStart.
-            self.stopStart = time.time()
-        self.check = True
+            self.stopStart = timestamp
+            self.listWidget.updateRecordedStep(self.stepIdx, data=self.data,
+                    holdTime=timestamp - self.keysDown[stepType][1])
 
-    def _update(self, stepType, updateFunc, reset=False):
-        """Updates data and hold time displayed in this step's widget.
+    def _finish(self, stepType, reset=False):
+        """Finishes the event, if it's being performed.
 
         Args:
             stepType (StepEnum): Type of this step.
-            updateFunc (func): Function to call to update displayed step data.
             reset (bool): If we want to reset the data to 0 upon finishing the
                           event. If mouse events were still implemented, this
                           would matter more because we would want the initial 
@@ -267,26 +301,13 @@ class ReleaselessEvent(StepEvent):
                           last move event stopped.
 
         """
-        # If the event hasn't occured for 1 second.
-        # TODO make configurable
-        if self.stopDelta >= 1 and self.endPosWidget != None:
-            self.stopDelta = 0
+        if self.stepIdx != None:
             if reset:
                 self.data = 0
-            self._dictDel(stepType)
-            self.endPosWidget = None
-        # Otherwise if the event hasn't occured for less than the
-        # threshold, update the time passed since the event last
-        # occured.
-        elif not self.check:
-            self.stopDelta = time.time() - self.stopStart
-        # Otherwise the event recently occured, so update the correct
-        # members and display.
-        elif self.check:
-            updateFunc()
-            timeTup = self.keysDown[stepType]
-            timeTup[0].setText('%.2f' % (time.time() - timeTup[1]))
-            self.check = False
+
+            # The step ended with the last time the event occurred.
+            self._endHold(stepType, self.stopStart)
+            self.stepIdx = None
 
 # Why not merge ReleaselessEvent into scroll event and avoid needless
 # inheritance? Because there previously was a mouse move event which also needed
@@ -295,27 +316,25 @@ class ReleaselessEvent(StepEvent):
 class ScrollEvent(ReleaselessEvent):
     """Event class for scroll events."""
 
-    def onScroll(self, startTime, x, y, dx, dy):
+    def onScroll(self, startTime, timestamp, x, y, dx, dy):
         """Callback for when the mouse is scrolled.
         
         Args:
             startTime (float): When this step started relative to the start
                                of the macro.
+            timestamp (float): Clock time the mouse was scrolled at.
             x (int): Current x position of the scroll wheel.
             y (int): Current y position of the scroll wheel.
             dx (int): X offset from last scroll wheel position.
             dy (int): Y offset from last scroll wheel position.
         """
-        self._onEvent(startTime, StepEnum.MOUSE_SCROLL, dy, increment=True)
+        self._onEvent(startTime, timestamp, StepEnum.MOUSE_SCROLL, dy,
+                increment=True)
 
-    def _updateText(self):
-        """Updates the data display in this step's widget."""
-        self.endPosWidget.setText(str(self.data))
+    def finish(self):
+        """Finishes the scroll step once the user stops scrolling.
 
-    def update(self):
-        """Updates the widget's data display and hold time.
-        
-        This method is what's called in the updater thread of KeyWatcher.
+        This method is what's called by the scroll timer of KeyWatcher.
         """
-        self._update(StepEnum.MOUSE_SCROLL, self._updateText, reset=True)
+        self._finish(StepEnum.MOUSE_SCROLL, reset=True)
 
@@ -0,0 +1,44 @@
+"""File for the step and event types.
+
+These are kept apart from StepConstants, which needs pynput, so playback can
+be imported on machines without a desktop.
+"""
+
+from enum import Enum
+
+class StepEnum(Enum):
+    """Enums for step types."""
+    ACTIVE_WAIT = 0
+    MOUSE_LEFT = 1
+    MOUSE_RIGHT = 2
+    MOUSE_SCROLL = 3
+    MOUSE_LEFT_DRAG = 4
+    MOUSE_RIGHT_DRAG = 5
+    KEY = 6
+
+    def __lt__(self, other):
+        """Less than operator overload for enums.
+
+        It doesn't actually matter which values are greater than which. We just
+        need to override this so tuples containing step types can be sorted.
+
+        Args:
+            other (StepEnum): The other StepEnum to compare to.
+
+        Return: True if the value of other is greater than self's value.
+                False otherwise.
+        """
+        return self.value < other.value
+
+class EventEnum(Enum):
+    """Enums for the events a macro is compiled into.
+
+    Each step of a macro is broken down into one or more of these events
+    before the macro runs. See MacroCompiler for more details.
+    """
+    KEY_DOWN = 0
+    KEY_UP = 1
+    MOUSE_DOWN = 2
+    MOUSE_UP = 3
+    SCROLL = 4
+    MOUSE_MOVE = 5
@@ -0,0 +1,116 @@
+"""File containing the class that records playback timings."""
+
+from StepTypes import StepEnum
+from array import array
+
+class PlaybackTelemetry():
+    """Ring buffer recording when each event of a macro actually fired.
+
+    Everything is stored in preallocated arrays so recording an event is
+    just a few assignments. Once the buffer is full, the oldest records are
+    overwritten.
+
+    Attributes:
+        size (int): Number of events the buffer holds.
+        stepTypes (array): Value of the StepEnum each event came from.
+        scheduled (array): When each event was supposed to fire.
+        emitted (array): When each event was actually sent.
+        durations (array): How long sending each event took.
+        count (int): Total number of events ever recorded.
+        loopMarks (list): Value of count at the start of each loop.
+    """
+
+    DEFAULT_SIZE = 1 << 16
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """Preallocates the buffer.
+
+        Args:
+            size (int): Number of events the buffer holds.
+        """
+        self.size = size
+        self.stepTypes = array('b', bytes(size))
+        self.scheduled = array('d', bytes(8 * size))
+        self.emitted = array('d', bytes(8 * size))
+        self.durations = array('d', bytes(8 * size))
+        self.count = 0
+        self.loopMarks = []
+
+    def markLoop(self):
+        """Marks that every event recorded from now on is in a new loop."""
+        self.loopMarks.append(self.count)
+
+    def record(self, stepType, scheduled, emitted, duration):
+        """Records a single event.
+
+        Args:
+            stepType (StepEnum): Type of step the event came from.
+            scheduled (float): When the event was supposed to fire.
+            emitted (float): When the event was actually sent.
+            duration (float): How long sending the event took.
+        """
+        idx = self.count % self.size
+        self.stepTypes[idx] = stepType.value
+        self.scheduled[idx] = scheduled
+        self.emitted[idx] = emitted
+        self.durations[idx] = duration
+        self.count += 1
+
+    def lateness(self, start=0, end=None):
+        """Groups how late each recorded event fired by step type.
+
+        Events that were already overwritten are skipped.
+
+        Args:
+            start (int): Number of the first event to include.
+            end (int): Number of the event to stop at. Defaults to every
+                       event recorded.
+
+        Return: Mapping of StepEnum -> list of lateness in seconds.
+        """
+        end = self.count if end is None else end
+        start = max(start, self.count - self.size)
+        grouped = {}
+        for num in range(start, end):
+            idx = num % self.size
+            late = self.emitted[idx] - self.scheduled[idx]
+            grouped.setdefault(self.stepTypes[idx], []).append(late)
+        return {StepEnum(value): lates for value, lates in grouped.items()}
+
+    def summary(self, start=0, end=None):
+        """Summarizes how late events fired for each step type.
+
+        Args:
+            start (int): Number of the first event to include.
+            end (int): Number of the event to stop at. Defaults to every
+                       event recorded.
+
+        Return: Mapping of StepEnum -> dict containing the number of events
+                and the 50th, 95th, and 99th percentile lateness in seconds.
+        """
+        summary = {}
+        for stepType, lates in self.lateness(start, end).items():
+            lates.sort()
+            summary[stepType] = {
+                'count': len(lates),
+                'p50': _percentile(lates, 50),
+                'p95': _percentile(lates, 95),
+                'p99': _percentile(lates, 99),
+            }
+        return summary
+
+    def loopSummary(self, loopIdx):
+        """Same as summary(), but only for the events of one loop.
+
+        Args:
+            loopIdx (int): Index of the loop to summarize.
+        """
+        start = self.loopMarks[loopIdx]
+        end = self.loopMarks[loopIdx + 1] if loopIdx + 1 < len(self.loopMarks) \
+                else self.count
+        return self.summary(start, end)
+
+def _percentile(ordered, percent):
+    """Returns the nearest-rank percentile of an already sorted list."""
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[rank]
@@ -0,0 +1,40 @@
+"""File containing the input backend that sends input to Windows."""
+
+from KeyboardController import InputBatch, MOUSEEVENTF_MOVE_ABSOLUTE, \
+        virtualScreen
+from InputBackend import InputBackend
+from KeyTable import keyTable
+
+class Win32Backend(InputBackend):
+    """Backend that sends input to Windows with SendInput.
+
+    Attributes:
+        batch (InputBatch): Inputs are added to this until flushed.
+    """
+
+    def __init__(self):
+        self.batch = InputBatch()
+
+    def keyTable(self):
+        return keyTable()
+
+    def virtualScreen(self):
+        return virtualScreen()
+
+    def keyDown(self, record):
+        self.batch.addKey(record.scan, extended=record.extended)
+
+    def keyUp(self, record):
+        self.batch.addKey(record.scan, keyUp=True, extended=record.extended)
+
+    def mouseMove(self, dx, dy):
+        self.batch.addMouse(dx, dy, MOUSEEVENTF_MOVE_ABSOLUTE)
+
+    def mouseButton(self, dx, dy, flags):
+        self.batch.addMouse(dx, dy, flags)
+
+    def scroll(self, ticks):
+        self.batch.addScroll(ticks)
+
+    def flush(self):
+        self.batch.flush()
@@ -3,7 +3,8 @@
 from PyQt5 import QtWidgets, QtCore
 from StepConstants import StepEnum, keyConst
 from pynput.keyboard import KeyCode, Key
-from win32api import MapVirtualKey
+from KeyTable import currentTable
+from MacroCompiler import validateOptions
 import json
 import os
 
@@ -48,9 +49,8 @@ def synchronize(func):
             *args: Aguments passed into the function being decorated.
 
         """
-        self.lock.acquire()
-        func(self, *args)
-        self.lock.release()
+        with self.lock:
+            return func(self, *args)
     return sync_function
 
 def read(filename, listWidget, recorder):
@@ -69,14 +69,21 @@ def read(filename, listWidget, recorder):
         delim = '\0\0\0'
         with open(filename, 'r') as toLoad:
             for line in toLoad:
-                name, steps, time, keys, keyString, loopNum = line.split(delim)
+                # Files written before macros had options don't have them.
+                # Invalid options would raise once the macro's hotkey is
+                # pressed, so they're dropped here.
+                fields = line.rstrip('\n').split(delim)
+                name, steps, time, keys, keyString, loopNum = fields[:6]
+                options = validateOptions(json.loads(fields[6])) \
+                        if len(fields) > 6 else {}
                 steps = _readSteps(steps)
                 keys = _readKeys(keys)
                 time = float(time)
                 loopNum = int(loopNum)
                 listWidget.reloadMacro(name, steps, time,
-                        keys, keyString, loopNum)
-                recorder.addHotkey(keys, steps, time, loopNum, recording=False)
+                        keys, keyString, loopNum, options)
+                recorder.addHotkey(keys, steps, time, loopNum, recording=False,
+                        options=options)
 
 def write(filename, listWidget):
     """Write the current macro data to a file.
@@ -96,20 +103,21 @@ def write(filename, listWidget):
         # Output buffer
         lines = []
         for toWrite in writable:
-            name, steps, time, keys, keyString, loopNum = toWrite
+            name, steps, time, keys, keyString, loopNum, options = toWrite
             steps = _serializeSteps(steps) if steps else steps
 
             # Delimit each hotkey key with a single null terminator
             keys = '\0'.join(map(lambda key: str(key), keys))
 
             lines.append(f'{name}\0\0\0{steps}\0\0\0{time}\0\0\0{keys}\0\0\0'
-                    f'{keyString}\0\0\0{loopNum}\n')
+                    f'{keyString}\0\0\0{loopNum}\0\0\0'
+                    f'{json.dumps(options or {})}\n')
         out.writelines(lines)
 
 def parseKey(
         key, 
         specialConvert=lambda string: string, 
-        vkConvert=lambda elem: chr(MapVirtualKey(elem, 2)), 
+        vkConvert=lambda elem: _vkToChar(elem), 
         normConvert=lambda string: string):
     """Applies a passed in function to the parsed key and returns the result.
 
@@ -147,6 +155,19 @@ def parseKey(
         # There's a special case where character is a single quote
         return normConvert(key.strip("'") if key != "\"'\"" else "'")
 
+def _vkToChar(vk):
+    """Returns the character the passed in virtual key code types.
+
+    Looks the virtual key code up in the current KeyTable, which is only
+    updated when KeyTable.refreshLayout is called (once per recording).
+
+    Args:
+        vk (int): Virtual key code to convert.
+
+    Return: The character typed by the virtual key code.
+    """
+    return currentTable().vkToChar(vk)
+
 def keyStringToKeyCode(keyString):
     return parseKey(keyString, keyConst, KeyCode.from_vk, KeyCode.from_char)
 